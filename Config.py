@@ -21,9 +21,43 @@ class Config:
     ZIP_DATA = True              # automatically zip the data
     DOWNLOAD_DATA = False         # download the previously uploaded data
     GENERATE_CSV = True           # include a user-friendly csv file for labels
+    JSON_INDENT = 4               # indentation of the COCO json, None for compact
+    SHARD_BY = None               # split the COCO json by 'folder' or 'annotations', None for one file
+    SHARD_SIZE = 100000           # annotations per shard when splitting by 'annotations'
     NEW_LOOKUP = True            # delete old values and create a new lookup table
     LOAD_LOOKUP = True
 
+    # archive extraction
+    SKIP_UNLABELLED_ARCHIVES = True   # drop cataloged archives without label files
+    EXTRACT_WORKERS = 4           # archives extracted at the same time
+    KEEP_SUFFIXES = ('.jpg', '.txt')  # archive members written to disk, besides directories
+    DEDUP_ON_EXTRACT = False      # hash zipped images before writing, skipping duplicates and their labels
+
+    # pipelined execution
+    PIPELINE = False              # overlap extraction, dedup, labels and srt parsing across folders
+    PIPELINE_THREADS = {'extract': 2, 'labels': 2, 'srt': 2}   # threads per stage, dedup uses one
+    PIPELINE_QUEUE_SIZE = 2       # folders waiting in front of each stage
+
+    # duplicate removal
+    HAMMING_THRESHOLD = 0         # max differing dhash bits for near duplicates
+    DEDUP_STRATEGY = 'index'      # 'index' for whole folder, 'window' for recent frames
+    DEDUP_WINDOW = 30             # recently kept frames compared with 'window'
+    HASH_PROCESSES = None         # hashing pool size, None for the number of CPUs
+    HASH_CHUNKSIZE = None         # paths per worker task, None to tune per folder
+    HASH_MIN_POOL_ITEMS = 64      # smaller folders are hashed without the pool
+    HASH_ALGOS = ('dhash',)       # registered hashes, concatenated when several
+    FAST_HASH = False             # decode jpegs at 1/8 scale when hashing
+    REMOVE_CROSS_DUPLICATES = False   # remove images duplicated in other folders of the hash store
+
+    # label reading
+    LABEL_READ_THREADS = 16       # threads overlapping label file reads
+
+    # srt parsing
+    SRT_PROCESSES = 4             # processes parsing srt files, 1 for serial
+    SRT_LABELLED_ONLY = True      # only parse telemetry of frames with yolo labels
+    SRT_CACHE_MAX_BYTES = 2 * 1024 ** 3   # evict least recently used parsed srt files above this size
+    SRT_CACHE_MAX_AGE = 30 * 24 * 3600    # evict parsed srt files unused for this many seconds
+
     # coco fields
     columns = ['class', 'x', 'y', 'w', 'h', 'filename',
                'width', 'height', 'frame', name_col]
@@ -0,0 +1,74 @@
+import argparse
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from PIL import Image
+
+from preprocess_data import DuplicateRemover, hamming_distance
+from benchmarks.synthetic import render_frame
+
+
+def make_frames(folder, count, width=640, height=512, seed=0):
+    """
+    Write synthetic JPEG frames resembling drone footage, a smooth scene with sensor noise.
+
+    Parameters:
+    folder (pathlib.Path): The folder to write the frames to.
+    count (int): The number of frames to write.
+    width (int): The width of each frame (default: 640).
+    height (int): The height of each frame (default: 512).
+    seed (int): The random seed (default: 0).
+
+    Returns:
+    paths (list): The paths of the written frames.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    paths = []
+    for frame in range(count):
+        path = folder / f'{frame:06d}.jpg'
+        Image.fromarray(render_frame(rng, frame, x, y)).save(path, quality=90)
+        paths.append(path)
+
+    return paths
+
+
+def time_hashes(remover, paths):
+    """
+    Hash every frame serially, returning the hashes and frames per second.
+    """
+    start = time.perf_counter()
+    hashes = [remover._make_hash(path) for path in paths]
+    elapsed = time.perf_counter() - start
+
+    return hashes, len(paths) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare exact and JPEG draft mode hashing')
+    parser.add_argument('-frames', type=int, default=200, help='Number of synthetic frames')
+    parser.add_argument('-seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = make_frames(Path(temp_dir), args.frames, seed=args.seed)
+        exact = DuplicateRemover(pd.DataFrame(), resample=Image.LANCZOS)
+        fast = DuplicateRemover(pd.DataFrame(), resample=Image.LANCZOS, fast_hash=True)
+
+        exact_hashes, exact_fps = time_hashes(exact, paths)
+        fast_hashes, fast_fps = time_hashes(fast, paths)
+
+    distances = np.array([hamming_distance(a, b) for a, b in zip(exact_hashes, fast_hashes)])
+    print(f'frames:              {args.frames}')
+    print(f'exact throughput:    {exact_fps:.1f} frames/s')
+    print(f'fast throughput:     {fast_fps:.1f} frames/s ({fast_fps / exact_fps:.2f}x)')
+    print(f'identical hashes:    {np.mean(distances == 0):.1%}')
+    print(f'mean bit difference: {distances.mean():.2f} of 128')
+    print(f'max bit difference:  {distances.max()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from PIL import Image
+
+from preprocess_data import DuplicateRemover, HASH_REGISTRY, hash_batch, hamming_distance
+from benchmarks.bench_fast_hash import make_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark each registered perceptual hash')
+    parser.add_argument('-frames', type=int, default=200, help='Number of synthetic frames')
+    parser.add_argument('-repeat', type=int, default=5, help='Timing repetitions per algorithm')
+    parser.add_argument('-seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    algorithms = list(HASH_REGISTRY)
+    remover = DuplicateRemover(pd.DataFrame(), resample=Image.LANCZOS, hash_algos=algorithms)
+
+    # decode every frame and a re-encoded copy once, for all algorithms together
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = make_frames(Path(temp_dir), args.frames, seed=args.seed)
+        copies = []
+        for path in paths:
+            copy = path.with_name(path.stem + '_copy.jpg')
+            Image.open(path).save(copy, quality=70)
+            copies.append(copy)
+
+        start = time.perf_counter()
+        grids = [remover._load_grids(path) for path in paths]
+        decode_time = time.perf_counter() - start
+        copy_grids = [remover._load_grids(path) for path in copies]
+
+    print(f'frames: {args.frames}, shared decode: {args.frames / decode_time:.1f} frames/s')
+    print(f'{"algorithm":<10} {"frames/s":>12} {"copy bits":>10} {"other bits":>11}')
+    for i, name in enumerate(algorithms):
+        grays = np.stack([grid[i] for grid in grids])
+        copy_grays = np.stack([grid[i] for grid in copy_grids])
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            hashes = hash_batch([name], [grays])
+        rate = args.frames * args.repeat / (time.perf_counter() - start)
+
+        # bits flipped by re-encoding versus bits between different frames
+        copy_hashes = hash_batch([name], [copy_grays])
+        copy_bits = np.mean([hamming_distance(a, b) for a, b in zip(hashes, copy_hashes)])
+        other_bits = np.mean([hamming_distance(a, b) for a, b in zip(hashes, hashes[1:])])
+        print(f'{name:<10} {rate:>12.0f} {copy_bits:>10.2f} {other_bits:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
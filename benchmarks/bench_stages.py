@@ -0,0 +1,185 @@
+import os
+import ast
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import time
+import pandas as pd
+
+from pathlib import Path
+
+import main as preprocess
+from Config import Config
+from preprocess_data import Metrics
+from benchmarks.synthetic import make_dataset
+
+STAGES = ('build_data', 'reduce_data_similarity', 'create_coco')
+
+
+def parse_scales(text):
+    """
+    Parse scales written as comma separated <folders>x<frames>, such as '2x50,4x200'.
+    """
+    scales = []
+    for scale in text.split(','):
+        folders, frames = scale.lower().split('x')
+        scales.append((int(folders), int(frames)))
+
+    return scales
+
+
+def run_stages(work, detect_df):
+    """
+    Run the stages of main.py over a synthetic dataset through its own functions, timing each one.
+
+    Parameters:
+    work (pathlib.Path): The working directory the archives are extracted into.
+    detect_df (pandas.DataFrame): The folders, as returned by make_dataset.
+
+    Returns:
+    results (dict): The 'items' processed and 'seconds' taken by each stage, with the 'duplicates' found.
+    """
+    results = {}
+    args = argparse.Namespace(data_path=work / 'data', save_local_data=False, overwrite_local_data=False,
+                              duplicate_data_path=work / 'dup_data.csv', hash_cache_path=None,
+                              hash_store_path=None, srt_cache_path=None, srt_cache_mode='use',
+                              output='labels.json', output_csv='labels.csv', frame_cache_path=None)
+    metrics = Metrics()
+
+    def timed(stage, function):
+        start = time.perf_counter()
+        value, items = function()
+        results[stage] = {'items': items, 'seconds': time.perf_counter() - start}
+        return value
+
+    def folder_items(stage):
+        return sum(record['items'] or 0 for record in metrics.report()['folders'] if record['stage'] == stage)
+
+    # extract the archives, deduping while extracting if configured
+    extracted_dups = timed('build_data', lambda: (preprocess.build_data(detect_df, args, metrics=metrics),
+                                                  folder_items('extract')))
+
+    # remove duplicates across a shared hashing pool
+    timed('reduce_data_similarity', lambda: (preprocess.reduce_data_similarity(detect_df, args, extracted_dups,
+                                                                               metrics=metrics),
+                                             folder_items('dedup')))
+    duplicates = pd.read_csv(args.duplicate_data_path)['dup_list'].map(lambda dups: len(ast.literal_eval(dups)))
+    results['duplicates'] = int(duplicates.sum())
+
+    # read the labels and telemetry, then merge and write the coco json
+    timed('create_coco', lambda: (None, preprocess.create_coco(detect_df, args)['annotations']))
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the throughput of each stage against the baseline, returning the regressed stages.
+    """
+    regressions = []
+    print(f'{"scale/stage":<32} {"items":>8} {"items/s":>12} {"baseline":>12} {"ratio":>7}')
+    for key, result in results.items():
+        rate = result['items_per_second']
+        reference = baseline.get(key)
+        ratio = rate / reference if reference else None
+        flag = ''
+        if ratio is not None and ratio < 1 - tolerance:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f'{key:<32} {result["items"]:>8} {rate:>12.1f} '
+              f'{reference if reference else float("nan"):>12.1f} '
+              f'{ratio if ratio else float("nan"):>7.2f}{flag}')
+
+    return regressions
+
+
+def host_key():
+    """
+    The key of this machine's baseline, its node name and cpu count, as throughputs only compare on one machine.
+    """
+    return f'{platform.node()}/{os.cpu_count()}cpus'
+
+
+def load_baseline(path, duplicate_rate):
+    """
+    Load this machine's baseline throughputs, or none with a warning if it has no baseline for the duplicate rate.
+    """
+    baselines = {}
+    if path.exists():
+        with open(path) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(host_key())
+    if baseline is None:
+        print(f'Warning: no baseline recorded on {host_key()} in {path}, skipping the comparison')
+        return {}
+    if baseline['duplicate_rate'] != duplicate_rate:
+        print(f'Warning: the baseline on {host_key()} used a duplicate rate of {baseline["duplicate_rate"]}, '
+              f'skipping the comparison')
+        return {}
+
+    return baseline['items_per_second']
+
+
+def save_baseline(path, results, duplicate_rate):
+    """
+    Record this run as this machine's baseline, keeping the baselines of other machines.
+    """
+    baselines = {}
+    if path.exists():
+        with open(path) as f:
+            baselines = json.load(f)
+    baselines[host_key()] = {'host': {'node': platform.node(), 'cpus': os.cpu_count(),
+                                      'python': platform.python_version()},
+                             'duplicate_rate': duplicate_rate,
+                             'items_per_second': {key: round(result['items_per_second'], 1)
+                                                  for key, result in results.items()}}
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=4)
+    print(f'Saved the baseline of {host_key()} to {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic datasets')
+    parser.add_argument('-scales', default='2x50,4x200', help='Comma separated <folders>x<frames> scales')
+    parser.add_argument('-duplicate_rate', type=float, default=0.3, help='Share of duplicated frames')
+    parser.add_argument('-width', type=int, default=Config.WIDTH, help='Frame width')
+    parser.add_argument('-height', type=int, default=Config.HEIGHT, help='Frame height')
+    parser.add_argument('-seed', type=int, default=0, help='Random seed')
+    parser.add_argument('-baseline', type=Path, default=Path(__file__).with_name('baselines.json'),
+                        help='Stored baseline throughputs of each machine to compare against')
+    parser.add_argument('-save_baseline', action='store_true', help="Overwrite this machine's baseline with this run")
+    parser.add_argument('-tolerance', type=float, default=0.5,
+                        help='Allowed throughput drop against the baseline before failing, wide for short noisy runs')
+    args = parser.parse_args()
+
+    results = {}
+    for folders, frames in parse_scales(args.scales):
+        scale = f'{folders}x{frames}'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            start = time.perf_counter()
+            detect_df = make_dataset(temp_dir / 'source', folders, frames, args.duplicate_rate,
+                                     args.width, args.height, seed=args.seed)
+            print(f'{scale}: generated in {time.perf_counter() - start:.1f}s')
+            stage_results = run_stages(temp_dir, detect_df)
+
+        duplicates = stage_results.pop('duplicates')
+        print(f'{scale}: {duplicates} of {folders * frames} frames removed as duplicates')
+        for stage in STAGES:
+            result = stage_results[stage]
+            result['items_per_second'] = result['items'] / max(result['seconds'], 1e-9)
+            results[f'{scale}/{stage}'] = result
+
+    regressions = compare(results, load_baseline(args.baseline, args.duplicate_rate), args.tolerance)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, args.duplicate_rate)
+    elif regressions:
+        print(f'{len(regressions)} stages regressed by more than {args.tolerance:.0%}: ' + ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import io
+import zipfile
+import numpy as np
+import pandas as pd
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from PIL import Image
+
+from Config import Config
+
+
+def render_frame(rng, frame, x, y):
+    """
+    Render a synthetic frame resembling drone footage, a smooth scene with sensor noise.
+
+    Parameters:
+    rng (numpy.random.Generator): The random generator placing blobs and noise.
+    frame (int): The frame number, drifting the background.
+    x (numpy.ndarray): The column coordinate of each pixel.
+    y (numpy.ndarray): The row coordinate of each pixel.
+
+    Returns:
+    rgb (numpy.ndarray): The frame as an 8 bit RGB array.
+    """
+    height, width = x.shape
+    # drifting blobs over a gradient background
+    scene = 80 + 60 * np.sin((x + 3 * frame) / 90) * np.cos(y / 70)
+    for cx, cy in rng.integers(0, [width, height], size=(6, 2)):
+        scene += 90 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / 800)
+    scene += rng.normal(0, 6, scene.shape)
+
+    return np.clip(np.stack([scene, scene * 0.9, scene * 0.8], axis=-1), 0, 255).astype(np.uint8)
+
+
+def srt_block(n, timestamp, latitude):
+    """
+    Format a DJI style subtitle block for a frame.
+    """
+    start = timedelta(milliseconds=33 * n)
+    end = start + timedelta(milliseconds=33)
+
+    def clock(delta):
+        seconds = delta.total_seconds()
+        return f'{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{int(seconds % 60):02d},' \
+               f'{int(delta.microseconds / 1000):03d}'
+
+    return (f'{n + 1}\n{clock(start)} --> {clock(end)}\n'
+            f'<font size="28">FrameCnt: {n + 1}, DiffTime: 33ms\n'
+            f'{timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]}\n'
+            f'[iso: 100] [shutter: 1/30.0] [fnum: 280] [ev: 0] [color_md: default] [focal_len: 240] '
+            f'[latitude: {latitude:.6f}] [longtitude: 153.412660] [rel_alt: 60.000 abs_alt: 78.779] '
+            f'[Drone: Yaw:-12.3, Pitch:0.0, Roll:1.2] </font>')
+
+
+def make_dataset(root, folders=2, frames=50, duplicate_rate=0.3, width=640, height=512,
+                 boxes=2, seed=0):
+    """
+    Write a deterministic synthetic dataset of zipped frames and labels with DJI style SRT files.
+
+    Each folder becomes <name>.zip holding <name>/<frame>.jpg and .txt pairs plus a placeholder video,
+    next to <name>.SRT with one subtitle block per frame. A share of the frames repeat the bytes of an
+    earlier frame of their folder, so they are exact duplicates.
+
+    Parameters:
+    root (pathlib.Path): The source directory to write the archives and SRT files to.
+    folders (int): The number of folders (default: 2).
+    frames (int): The number of frames per folder (default: 50).
+    duplicate_rate (float): The share of frames duplicating an earlier frame (default: 0.3).
+    width (int): The width of each frame (default: 640).
+    height (int): The height of each frame (default: 512).
+    boxes (int): The number of labelled boxes per frame (default: 2).
+    seed (int): The random seed (default: 0).
+
+    Returns:
+    detect_df (pandas.DataFrame): The folder, archive and SRT path of each folder, as built by load_data.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+
+    rows = []
+    for folder in range(folders):
+        name = f'flight_{folder:04d}'
+        start = datetime(2023, 1, 17, 20, 37) + timedelta(hours=folder)
+
+        encoded = []
+        with zipfile.ZipFile(root / f'{name}.zip', 'w') as zf:
+            for frame in range(1, frames + 1):
+                # repeat an earlier frame, or render a new one
+                if encoded and rng.random() < duplicate_rate:
+                    content = encoded[rng.integers(len(encoded))]
+                else:
+                    buffer = io.BytesIO()
+                    Image.fromarray(render_frame(rng, frame, x, y)).save(buffer, format='JPEG', quality=90)
+                    content = buffer.getvalue()
+                    encoded.append(content)
+                zf.writestr(f'{name}/{frame:06d}.jpg', content)
+
+                # yolo boxes with known classes, centres and sizes normalised to the frame
+                labels = np.column_stack([rng.integers(0, len(Config.classes), boxes),
+                                          rng.uniform(0.1, 0.9, (boxes, 2)),
+                                          rng.uniform(0.01, 0.1, (boxes, 2))])
+                zf.writestr(f'{name}/{frame:06d}.txt',
+                            '\n'.join(f'{int(row[0])} ' + ' '.join(f'{v:.6f}' for v in row[1:])
+                                      for row in labels) + '\n')
+            zf.writestr(f'{name}/{name}.MP4', bytes(1024))
+
+        # one subtitle block per frame, block n describing frame n
+        blocks = [srt_block(n, start + timedelta(milliseconds=33 * n), -28.79 - n * 1e-6)
+                  for n in range(frames + 1)]
+        with open(root / f'{name}.SRT', 'w') as f:
+            f.write('\n\n'.join(blocks) + '\n\n')
+
+        rows.append({Config.name_col: name,
+                     Config.zip_col: str(root / f'{name}.zip'),
+                     Config.srt_col: str(root / f'{name}.SRT')})
+
+    return pd.DataFrame(rows)
@@ -3,14 +3,14 @@ from Config import Config
 
 import argparse
 import logging
-import patoolib
 import os
 import shutil
-import json
 import pandas as pd
 import PIL
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from multiprocessing.pool import Pool
 from pathlib import Path
 
 
@@ -32,6 +32,14 @@ def parse_args():
                         help='Path to training data')
     parser.add_argument('-duplicate_data_path', type=Path, default='dup_data.csv',
                         help='Path to duplicate data')
+    parser.add_argument('-hash_cache_path', type=Path, default='hash_cache.db',
+                        help='Path to the per-image hash cache')
+    parser.add_argument('-hash_store_path', type=Path, default=None,
+                        help='Path to the global hash store for cross folder duplicates')
+    parser.add_argument('-srt_cache_path', type=Path, default=None,
+                        help='Path to the cache of parsed SRT files')
+    parser.add_argument('-srt_cache_mode', default='use', choices=pp.SrtCache.modes,
+                        help='Use, bypass or rebuild the parsed SRT cache')
     parser.add_argument('-output', default='labels.json',
                         type=str, help='Name for output COCO file')
     parser.add_argument('-output_csv', default='labels.csv',
@@ -40,6 +48,14 @@ def parse_args():
                         type=bool, help='Save a local copy of the data before unzipping')
     parser.add_argument('-overwrite_local_data', default=False,
                         type=bool, help='Overwrite local data if it already exists')
+    parser.add_argument('-archive_catalog_path', type=Path, default='archive_catalog.db',
+                        help='Path to the catalog of source archives and their members')
+    parser.add_argument('-metrics_output', default=None, type=str,
+                        help='Name for the metrics json written next to the COCO file, None to disable metrics')
+    parser.add_argument('-run_manifest_path', type=Path, default=None,
+                        help='Path to the run manifest of completed stages, default run_manifest.json in the data path')
+    parser.add_argument('-frame_cache_path', type=Path, default='frame_cache',
+                        help='Path to the cache of label and SRT frames of each folder')
     args = parser.parse_args()
 
     logging.info('Detection path: ' + str(args.detect_table_path))
@@ -47,10 +63,30 @@ def parse_args():
     logging.info('Data path: ' + str(args.data_path))
     logging.info('Training data path: ' + str(args.training_data_path))
     logging.info('Duplicate data path: ' + str(args.duplicate_data_path))
+    logging.info('Hash cache path: ' + str(args.hash_cache_path))
+    logging.info('Hash store path: ' + str(args.hash_store_path))
+    logging.info('SRT cache path: ' + str(args.srt_cache_path))
+    logging.info('Archive catalog path: ' + str(args.archive_catalog_path))
+    logging.info('Run manifest path: ' + str(args.run_manifest_path))
+    logging.info('Frame cache path: ' + str(args.frame_cache_path))
 
     return args
 
 
+def check_settings(args):
+    """
+    Check that the configured settings work together, before any data is extracted
+
+    Args:
+    args (argparse.Namespace): Namespace containing the hash_store_path attribute.
+    """
+    # the global hash store holds hashes of at most 128 bits
+    bits = pp.hash_bits(Config.HASH_ALGOS)
+    if args.hash_store_path and bits > pp.HashStore.bits:
+        raise ValueError(f'HASH_ALGOS {Config.HASH_ALGOS} make {bits} bit hashes, '
+                         f'but the hash store holds {pp.HashStore.bits} bits')
+
+
 def load_data(args):
     """
     Loads, filters and selects data for processing
@@ -71,8 +107,10 @@ def load_data(args):
     # create column for .zip file names
     detect_df[Config.zip_col] = detect_df[Config.name_col].apply(
         lambda x: str(args.source_path)+'/'+x+'.zip')
-    # zips = glob(str(args.source_path / '*'))
-    # detect_df = detect_df[detect_df[Config.zip_col].isin(zips)]
+
+    # drop missing, unreadable and unlabelled archives using the catalog
+    if args.archive_catalog_path:
+        detect_df = filter_archives(detect_df, args)
 
     logging.info('Selecting SRT data.')
 
@@ -84,43 +122,223 @@ def load_data(args):
     return detect_df
 
 
-def build_data(detect_df, args):
+def dedup_settings():
+    """
+    Duplicate matching settings shared by dedup-on-extract and reduce_data_similarity
+
+    Returns:
+    dict: Keyword arguments for pp.DuplicateRemover
+    """
+    return {'resample': PIL.Image.LANCZOS,
+            'threshold': Config.HAMMING_THRESHOLD,
+            'strategy': Config.DEDUP_STRATEGY,
+            'window_size': Config.DEDUP_WINDOW,
+            'fast_hash': Config.FAST_HASH,
+            'hash_algos': Config.HASH_ALGOS}
+
+
+def open_manifest(args):
+    """
+    Open the run manifest, recording the stages completed for each folder across runs
+
+    Returns:
+    pp.RunManifest: The manifest at run_manifest_path, or in the data path by default
+    """
+    path = args.run_manifest_path or args.data_path / 'run_manifest.json'
+    logging.info(f'Resuming from the run manifest at {path}')
+
+    return pp.RunManifest(path)
+
+
+def extract_fingerprint(zip_file):
+    """
+    Fingerprint the inputs of extracting an archive
+    """
+    settings = dedup_settings() if Config.DEDUP_ON_EXTRACT else None
+
+    return {'archive': pp.file_fingerprint(zip_file),
+            'keep_suffixes': Config.KEEP_SUFFIXES,
+            'dedup_on_extract': settings}
+
+
+def dedup_fingerprint(args):
+    """
+    Fingerprint the settings of removing duplicates from an extracted folder
+    """
+    return {'settings': dedup_settings(),
+            'hash_store': str(args.hash_store_path)}
+
+
+def frames_fingerprint(name, SR, args):
+    """
+    Fingerprint the label files, SRT files and settings the label rows and SRT data of a folder are read with
+    """
+    return {'labels': pp.folder_digest(args.data_path / name),
+            'srt': [pp.file_fingerprint(srt_file) for srt_file in SR.folder_files(name)],
+            'settings': {'srt_labelled_only': Config.SRT_LABELLED_ONLY,
+                         'height': Config.HEIGHT,
+                         'width': Config.WIDTH,
+                         'classes': Config.classes,
+                         'columns': Config.columns}}
+
+
+def coco_fingerprint(fingerprints, args):
+    """
+    Fingerprint the frames of every folder and the settings the COCO dataset is written with
+    """
+    return {'frames': pp.json_digest(fingerprints),
+            'settings': {'version': Config.version,
+                         'json_indent': Config.JSON_INDENT,
+                         'shard_by': Config.SHARD_BY,
+                         'shard_size': Config.SHARD_SIZE,
+                         'generate_csv': Config.GENERATE_CSV,
+                         'output': args.output,
+                         'output_csv': args.output_csv}}
+
+
+def coco_output(args):
+    """
+    The file the COCO dataset is written to, the shard manifest when sharding
+    """
+    json_output = os.path.join(args.data_path, args.output)
+    if Config.SHARD_BY is None:
+        return json_output
+
+    return pp.CocoWriter().manifest_path(json_output)
+
+
+def coco_up_to_date(manifest, fingerprint, args):
+    """
+    Whether the COCO dataset was written from the same frames and settings and is still in place
+    """
+    if manifest is None or not manifest.done(None, 'coco', fingerprint) or not os.path.exists(coco_output(args)):
+        return False
+    logging.info('COCO dataset is up to date with its labels and SRT files.')
+
+    return True
+
+
+def filter_archives(detect_df, args):
+    """
+    Refresh the archive catalog and keep the folders whose archive exists, can be read and has labels
+
+    Args:
+    detect_df (pandas.DataFrame): DataFrame containing the archive of each folder.
+    args (argparse.Namespace): Namespace containing the source_path and archive_catalog_path attributes.
+
+    Returns:
+    DataFrame: The folders with usable archives
+    """
+    catalog = pp.ArchiveCatalog(args.archive_catalog_path)
+    catalog.refresh(args.source_path)
+    summaries = catalog.summarise(detect_df[Config.zip_col], keep_suffixes=Config.KEEP_SUFFIXES)
+    catalog.close()
+
+    # report the archives that would fail or produce no labels
+    statuses = pd.Series([summary['status'] for summary in summaries], index=detect_df.index)
+    for status in ['missing', 'bad', 'unlabelled']:
+        names = detect_df.loc[statuses == status, Config.name_col]
+        if len(names):
+            logging.info(f'Skipping {len(names)} {status} archives: ' + ', '.join(names))
+    usable = statuses == 'ok' if Config.SKIP_UNLABELLED_ARCHIVES else statuses.isin(['ok', 'unlabelled'])
+
+    # estimate the extraction cost of the remaining archives
+    kept = [summary for summary, keep in zip(summaries, usable) if keep]
+    logging.info(f'{len(kept)} archives to extract: {sum(s["members"] for s in kept)} members, '
+                 f'{sum(s["compressed"] for s in kept) / 1e6:.1f} MB read, '
+                 f'{sum(s["bytes"] for s in kept) / 1e6:.1f} MB written')
+
+    return detect_df[usable]
+
+
+def seed_manifest(detect_df, args, manifest):
+    """
+    Record the folders of a data path extracted before the run manifest existed as extracted,
+    so they are kept instead of extracted again over their deduped images
+
+    Args:
+    detect_df (pandas.DataFrame): DataFrame containing the archive of each folder.
+    args (argparse.Namespace): Namespace containing the data_path and overwrite_local_data attributes.
+    manifest (pp.RunManifest): The run manifest.
+    """
+    if manifest.path.exists() or args.overwrite_local_data or not args.data_path.is_dir():
+        return
+
+    folders_df = detect_df.drop_duplicates(Config.name_col)
+    seeded = 0
+    for name, zip_file in zip(folders_df[Config.name_col], folders_df[Config.zip_col]):
+        if (args.data_path / name).is_dir():
+            manifest.complete(name, 'extract', extract_fingerprint(zip_file))
+            seeded += 1
+    logging.info(f'Recorded {seeded} folders extracted before the run manifest existed')
+
+
+def build_data(detect_df, args, manifest=None, metrics=None):
     """
     Extracts data from folders and archives
+
+    Args:
+    detect_df (pandas.DataFrame): DataFrame containing the archive of each folder.
+    args (argparse.Namespace): Namespace containing the data_path, save_local_data and overwrite_local_data attributes.
+    manifest (pp.RunManifest): Skip folders already extracted from unchanged archives, or None to extract all.
+    metrics (pp.Metrics): Records the extraction of each folder, or None.
+
+    Returns:
+    dict: The duplicate list of each folder deduped while extracting, keyed by image directory
     """
-    logging.info(f'{len(detect_df)} folders to extract: ')
-    logging.info(', '.join(detect_df[Config.name_col].values))
-    logging.info('Extracting data.')
+    # keep an existing data path as it is without a manifest to resume from
+    if manifest is None and args.data_path.exists() and not args.overwrite_local_data:
+        logging.info(f'Keeping the extracted data in {args.data_path}')
+        return {}
 
     # create the data folder
-    try:
-        args.data_path.mkdir()
-    except FileExistsError:
-        if not args.overwrite_local_data:
-            return None
-
-    # iterate and extract each archive
-    count = 0
-    for zip_file in detect_df[Config.zip_col]:
-        try:
-            logging.info(f'Extracting {zip_file}.')
-            if args.save_local_data:
-                shutil.copy(zip_file, 'tmp.zip')
-                zip_file = 'tmp.zip'
-            patoolib.extract_archive(zip_file, outdir=args.data_path)
-            count += 1
-        except Exception:
-            logging.info(f'Skipping {zip_file}')
-
-    logging.info(f'Successfully extracted {count} archives')
-    
+    args.data_path.mkdir(exist_ok=True)
+    if manifest is not None:
+        seed_manifest(detect_df, args, manifest)
+
+    # only extract folders that are new or whose archive changed, unless overwriting
+    folders_df = detect_df.drop_duplicates(Config.name_col)
+    if manifest is not None and not args.overwrite_local_data:
+        pending = [not manifest.done(name, 'extract', extract_fingerprint(zip_file))
+                   for name, zip_file in zip(folders_df[Config.name_col], folders_df[Config.zip_col])]
+        logging.info(f'{len(pending) - sum(pending)} folders already extracted')
+        folders_df = folders_df[pending]
+
+    logging.info(f'{len(folders_df)} folders to extract: ')
+    logging.info(', '.join(folders_df[Config.name_col].values))
+    logging.info('Extracting data.')
+
+    # hash zipped images before writing them to skip duplicates if configured
+    remover = None
+    if Config.DEDUP_ON_EXTRACT:
+        remover = pp.DuplicateRemover(pd.DataFrame(), **dedup_settings())
+
+    # extract the archives in parallel
+    extractor = pp.ArchiveExtractor(workers=Config.EXTRACT_WORKERS,
+                                    save_local=args.save_local_data,
+                                    keep_suffixes=Config.KEEP_SUFFIXES,
+                                    remover=remover)
+    reports = extractor.extract_all(folders_df[Config.zip_col], args.data_path)
+    extracted_dups = {}
+    for name, zip_file, report in zip(folders_df[Config.name_col], folders_df[Config.zip_col], reports):
+        extracted_dups.update(report['duplicates'])
+        if metrics is not None:
+            metrics.add({'stage': 'extract', 'folder': name, 'items': report['members'],
+                         'wall_seconds': report['seconds'], 'archive_bytes': report['bytes_read'],
+                         'bytes_written': report['bytes_written'], 'ok': report['ok']})
+        if manifest is not None and report['ok']:
+            manifest.complete(name, 'extract', extract_fingerprint(zip_file),
+                              report['duplicates'].get(str(args.data_path / name)))
+
     # remove empty directories
     for folder in args.data_path.glob('*'):
-        if not any(folder.iterdir()):
+        if folder.is_dir() and not any(folder.iterdir()):
             os.rmdir(folder)
 
+    return extracted_dups
+
 
-def reduce_data_similarity(detect_df, args):
+def reduce_data_similarity(detect_df, args, extracted_dups=None, manifest=None, metrics=None):
     """
     Removes duplicate images from data
 
@@ -129,11 +347,75 @@ def reduce_data_similarity(detect_df, args):
     args (argparse.Namespace): Namespace containing the following attributes:
         data_path (pathlib.Path): Path to the directory containing the images.
         duplicate_data_path (str): Filepath to the lookup table to check for duplicates.
+        hash_cache_path (pathlib.Path): Path to the per-image hash cache, or None to use the lookup table.
+        hash_store_path (pathlib.Path): Path to the global hash store, or None to only dedup within folders.
+    extracted_dups (dict): The duplicate lists of folders already deduped while extracting, or None.
+    manifest (pp.RunManifest): Skip folders already deduped with the same settings, or None to dedup all.
+    metrics (pp.Metrics): Records the dedup of each folder, or None.
     """
+    extracted_dups = extracted_dups or {}
+
     # collate new images list
     img_dir_list = [args.data_path /
                     name for name in detect_df[Config.name_col]]
 
+    # remove duplicates, reusing one hashing pool across every folder
+    DR = open_remover(args)
+    with pp.HashExecutor(DR,
+                         processes=Config.HASH_PROCESSES,
+                         chunksize=Config.HASH_CHUNKSIZE,
+                         min_pool_items=Config.HASH_MIN_POOL_ITEMS) as executor:
+        DR.executor = executor
+        metrics = metrics or pp.Metrics(enabled=False)
+        for img_dir in img_dir_list:
+            with metrics.stage('dedup', img_dir.name) as record:
+                record['items'] = dedup_folder(DR, img_dir, extracted_dups.get(str(img_dir)), args, manifest)
+    close_remover(DR, args)
+
+
+def dedup_folder(DR, img_dir, extracted_dups, args, manifest=None):
+    """
+    Remove the duplicates of a folder, or restore its duplicate list if it was deduped in a previous run
+
+    Args:
+    DR (pp.DuplicateRemover): The duplicate remover returned by open_remover.
+    img_dir (pathlib.Path): The folder of images and labels.
+    extracted_dups (list): The duplicates dropped while extracting the folder, or None.
+    args (argparse.Namespace): Namespace as passed to reduce_data_similarity.
+    manifest (pp.RunManifest): The run manifest, or None to always dedup.
+
+    Returns:
+    int: The number of images checked, 0 if the duplicate list was restored
+    """
+    if manifest is None:
+        return DR.remove_duplicates(img_dir, extracted_dups)
+
+    record = manifest.record(img_dir.name, 'dedup')
+    if manifest.done(img_dir.name, 'dedup', dedup_fingerprint(args)):
+        DR.lookup[str(img_dir)] = [tuple(pair) for pair in record['result']]
+        return 0
+
+    # duplicates dropped while extracting in an earlier run are kept with the extract record
+    if extracted_dups is None:
+        extract = manifest.record(img_dir.name, 'extract')
+        if extract is not None and extract['result'] is not None:
+            extracted_dups = [tuple(pair) for pair in extract['result']]
+    checked = DR.remove_duplicates(img_dir, extracted_dups)
+    manifest.complete(img_dir.name, 'dedup', dedup_fingerprint(args), DR.lookup.get(str(img_dir), []))
+
+    return checked
+
+
+def open_remover(args):
+    """
+    Create the duplicate remover with its lookup table, hash cache and global hash store
+
+    Args:
+    args (argparse.Namespace): Namespace as passed to reduce_data_similarity.
+
+    Returns:
+    pp.DuplicateRemover: The configured duplicate remover
+    """
     # create new lookup table if configured
     lookup_df = pd.DataFrame(columns=['img_dir', 'dup_list'])
     if not Config.LOAD_LOOKUP:
@@ -142,11 +424,32 @@ def reduce_data_similarity(detect_df, args):
         except Exception as e:
             logging.warning(e)
 
-    # remove duplicates
-    DR = pp.DuplicateRemover(lookup_df=lookup_df,
-                             resample=PIL.Image.LANCZOS)
-    for img_dir in img_dir_list:
-        DR.remove_duplicates(img_dir)
+    # open the hash cache and global hash store if configured
+    algorithm = '+'.join(Config.HASH_ALGOS) + ('_fast' if Config.FAST_HASH else '')
+    hash_cache = None
+    if args.hash_cache_path:
+        hash_cache = pp.HashCache(args.hash_cache_path, algorithm=algorithm)
+    hash_store = None
+    if args.hash_store_path:
+        hash_store = pp.HashStore(args.hash_store_path, algorithm=algorithm)
+
+    return pp.DuplicateRemover(lookup_df=lookup_df,
+                               hash_store=hash_store,
+                               remove_cross=Config.REMOVE_CROSS_DUPLICATES,
+                               hash_cache=hash_cache,
+                               **dedup_settings())
+
+
+def close_remover(DR, args):
+    """
+    Close the hash cache and write the lookup table and cross folder duplicates of a duplicate remover
+
+    Args:
+    DR (pp.DuplicateRemover): The duplicate remover returned by open_remover.
+    args (argparse.Namespace): Namespace as passed to reduce_data_similarity.
+    """
+    if DR.hash_cache is not None:
+        DR.hash_cache.close()
 
     # write new lookup table
     if Config.NEW_LOOKUP:
@@ -154,8 +457,16 @@ def reduce_data_similarity(detect_df, args):
             f'Overwriting duplicate lookup table at {args.duplicate_data_path}')
         DR.lookup_df.to_csv(args.duplicate_data_path, index=False)
 
+    # report duplicates found across folders
+    if DR.hash_store is not None:
+        report_path = args.hash_store_path / 'cross_duplicates.csv'
+        logging.info(f'Writing {len(DR.cross_duplicates)} cross folder duplicates to {report_path}')
+        pd.DataFrame(DR.cross_duplicates,
+                     columns=['img_dir', 'frame', 'dup_folder', 'dup_frame', 'distance']
+                     ).to_csv(report_path, index=False)
+
 
-def create_coco(detect_df, args):
+def create_coco(detect_df, args, manifest=None):
     """
     Create COCO dataset from YOLO labels and SRT data.
 
@@ -165,24 +476,199 @@ def create_coco(detect_df, args):
         data_path (pathlib.Path): Path to the directory containing the YOLO labels.
         output (str): Filepath to save the COCO data in JSON format.
         output_csv (str): Filepath to save the merged DataFrame in CSV format.
+        srt_cache_path (pathlib.Path): Path to the parsed SRT cache, or None to parse every file.
+        srt_cache_mode (str): Whether to use, bypass or rebuild the parsed SRT cache.
+        frame_cache_path (pathlib.Path): Path to the cache of each folder's label rows and SRT data.
+    manifest (pp.RunManifest): Skip creating the dataset again from unchanged inputs and reuse the frames of
+        unchanged folders, or None to always read every folder.
+
+    Returns:
+    dict: The counts of COCO records written, or None if the dataset was up to date
+    """
+    SR = make_srt_reader(detect_df, args)
+    folders = coco_folders(detect_df, args)
+    fingerprints = {name: frames_fingerprint(name, SR, args) for name in folders}
+    fingerprint = coco_fingerprint(fingerprints, args)
+    if coco_up_to_date(manifest, fingerprint, args):
+        return None
+
+    logging.info('Reading YOLO labels and SRT data.')
+
+    # read the labels and SRT data of changed folders, the SRT files parsed across a pool if configured
+    LR = pp.LabelReader(threads=Config.LABEL_READ_THREADS)
+    frame_cache = open_frame_cache(args, manifest)
+    srt_pool = Pool(Config.SRT_PROCESSES) if Config.SRT_PROCESSES > 1 else None
+    try:
+        with ThreadPoolExecutor(max(1, Config.SRT_PROCESSES)) as executor:
+            frames = executor.map(lambda name: folder_frames(name, fingerprints[name], LR, SR, args,
+                                                             manifest, frame_cache, srt_pool), folders)
+            frames = dict(zip(folders, frames))
+    finally:
+        if srt_pool is not None:
+            srt_pool.close()
+            srt_pool.join()
+
+    label_df, srt_df = combine_frames(folders, frames, SR)
+    counts = write_coco(label_df, srt_df, args)
+    if manifest is not None:
+        manifest.complete(None, 'coco', fingerprint)
+
+    return counts
+
+
+def coco_folders(detect_df, args):
     """
-    logging.info('Extracting SRT.')
+    List the folders the COCO dataset is created from, every folder in the data path and in the detection table
 
-    # extract corresponding SRT data
-    SR = pp.SrtReader(detect_df,
-                      srt_col_name=Config.srt_col,
-                      folder_col_name=Config.name_col,
-                      drop_cols=['color_md'])
-    srt_df = SR.make_df()
+    Returns:
+    list: The folder names, sorted as LabelReader reads them
+    """
+    folders = {entry.name for entry in os.scandir(args.data_path) if entry.is_dir()}
+    folders.update(detect_df[Config.name_col])
+
+    # sorted by path, as read_all lists the label files of every folder
+    return sorted(folders, key=lambda name: name + os.sep)
 
-    logging.info('Converting YOLO to DataFrame.')
 
-    # convert yolo labels into a dataframe
-    dir_list = args.data_path.rglob('*/*.txt')
+def open_frame_cache(args, manifest):
+    """
+    Open the cache of each folder's label rows and SRT data, used while resuming from a manifest
+
+    Returns:
+    pp.FrameCache: The cache at frame_cache_path, or None if there is no manifest or path
+    """
+    if manifest is None or not args.frame_cache_path:
+        return None
+
+    return pp.FrameCache(args.frame_cache_path)
+
+
+def read_labels(name, LR, args):
+    """
+    Read the YOLO labels of a folder into a DataFrame
+    """
+    label_files, label_texts = LR.read_folder(args.data_path / name)
     YOLO2DF = pp.Yolo2df(Config.HEIGHT, Config.WIDTH,
                          Config.classes, Config.columns)
-    label_df = YOLO2DF.write_df(dir_list)
 
+    return YOLO2DF.texts_to_df(label_files, label_texts)
+
+
+def read_srt(name, label_df, SR, srt_pool=None):
+    """
+    Parse the SRT files of a folder, only for its labelled frames if configured
+
+    Returns:
+    list: The parsed DataFrame of each SRT file of the folder
+    """
+    frames = set(label_df['frame'].tolist()) if Config.SRT_LABELLED_ONLY else None
+
+    return list(SR.load_folder(name, frames, srt_pool).values())
+
+
+def folder_frames(name, fingerprint, LR, SR, args, manifest=None, frame_cache=None, srt_pool=None):
+    """
+    Read the label rows and SRT data of a folder, or load them from the frame cache if the folder is unchanged
+
+    Args:
+    name (str): The folder name.
+    fingerprint (dict): The fingerprint of the folder's frames, as returned by frames_fingerprint.
+    LR (pp.LabelReader): The label reader.
+    SR (pp.SrtReader): The SRT reader of the detection table.
+    args (argparse.Namespace): Namespace as passed to create_coco.
+    manifest (pp.RunManifest): Records the folders whose frames are cached, or None.
+    frame_cache (pp.FrameCache): The frame cache, or None to always read the folder.
+    srt_pool (multiprocessing.pool.Pool): A process pool parsing the SRT files, or None.
+
+    Returns:
+    tuple: The label DataFrame and the parsed DataFrame of each SRT file of the folder
+    """
+    if frame_cache is not None and manifest.done(name, 'frames', fingerprint):
+        frames = frame_cache.load(name)
+        if frames is not None:
+            return frames
+
+    label_df = read_labels(name, LR, args)
+    frames = label_df, read_srt(name, label_df, SR, srt_pool)
+    cache_frames(name, fingerprint, frames, manifest, frame_cache)
+
+    return frames
+
+
+def cache_frames(name, fingerprint, frames, manifest=None, frame_cache=None):
+    """
+    Save the label rows and SRT data of a folder to the frame cache and record them in the manifest
+    """
+    if frame_cache is None:
+        return
+    frame_cache.save(name, *frames)
+    manifest.complete(name, 'frames', fingerprint)
+
+
+def combine_frames(folders, frames, SR):
+    """
+    Combine the frames of every folder, the labels in folder order and the SRT data in table order
+
+    Args:
+    folders (list): The folder names, as returned by coco_folders.
+    frames (dict): The label DataFrame and SRT DataFrames of each folder, as returned by folder_frames.
+    SR (pp.SrtReader): The SRT reader of the detection table.
+
+    Returns:
+    tuple: The label DataFrame and SRT DataFrame of every folder
+    """
+    if folders:
+        label_df = pd.concat([frames[name][0] for name in folders], ignore_index=True)
+    else:
+        label_df = pp.Yolo2df(Config.HEIGHT, Config.WIDTH, Config.classes, Config.columns).texts_to_df([], [])
+
+    srt_dfs = [None] * len(SR.srt_list)
+    for name in folders:
+        for position, srt_df in zip(SR.folder_rows.get(name, []), frames[name][1]):
+            srt_dfs[position] = srt_df
+
+    return label_df, SR.combine(srt_dfs)
+
+
+def make_srt_reader(detect_df, args):
+    """
+    Create the SRT reader of the detection table, with the parsed SRT cache if configured
+
+    Args:
+    detect_df (pandas.DataFrame): DataFrame containing the SRT paths.
+    args (argparse.Namespace): Namespace as passed to create_coco.
+
+    Returns:
+    pp.SrtReader: The configured SRT reader
+    """
+    # open the parsed SRT cache if configured
+    srt_cache = None
+    if args.srt_cache_path:
+        srt_cache = pp.SrtCache(args.srt_cache_path,
+                                max_bytes=Config.SRT_CACHE_MAX_BYTES,
+                                max_age=Config.SRT_CACHE_MAX_AGE,
+                                mode=args.srt_cache_mode)
+
+    return pp.SrtReader(detect_df,
+                        srt_col_name=Config.srt_col,
+                        folder_col_name=Config.name_col,
+                        drop_cols=['color_md'],
+                        processes=Config.SRT_PROCESSES,
+                        cache=srt_cache)
+
+
+def write_coco(label_df, srt_df, args):
+    """
+    Merge the YOLO labels with the SRT data and write the COCO dataset.
+
+    Args:
+    label_df (pandas.DataFrame): DataFrame of YOLO labels.
+    srt_df (pandas.DataFrame): DataFrame of SRT data.
+    args (argparse.Namespace): Namespace as passed to create_coco.
+
+    Returns:
+    dict: The counts of COCO images and annotations written
+    """
     logging.info('Merging SRT and yolo data.')
 
     # join SRT and yolo label dataframes
@@ -199,20 +685,164 @@ def create_coco(detect_df, args):
     DF2COCO = pp.DF2Coco(version=Config.version,
                          year=year,
                          date_created=date_created)
-    label_coco = DF2COCO.convert_df(label_srt_df)
 
     json_output = os.path.join(args.data_path, args.output)
-    logging.info('Count of images generated: ' +
-                 str(len(label_coco['images'])))
     logging.info('Saving COCO data to ' + json_output)
 
-    # save data to csv and json files
-    json.dump(label_coco, open(json_output, "w"), indent=4)
+    # stream the coco records to the json file, or to shards with a manifest
+    writer = pp.CocoWriter(indent=Config.JSON_INDENT)
+    if Config.SHARD_BY is None:
+        counts = writer.write(json_output, DF2COCO, label_srt_df)
+    else:
+        manifest = writer.write_shards(json_output, DF2COCO, label_srt_df,
+                                       shard_by=Config.SHARD_BY,
+                                       shard_size=Config.SHARD_SIZE,
+                                       folder_col=Config.name_col)
+        counts = {key: sum(shard[key] for shard in manifest['shards']) for key in ('images', 'annotations')}
+        logging.info(f'Wrote {len(manifest["shards"])} COCO shards by {Config.SHARD_BY}')
+    logging.info('Count of images generated: ' + str(counts['images']))
+
+    # save data to csv file
     if Config.GENERATE_CSV:
         csv_output = os.path.join(args.data_path, args.output_csv)
         logging.info('Saving dataframe to ' + csv_output)
         label_srt_df.to_csv(csv_output)
 
+    return counts
+
+
+def run_pipeline(detect_df, args, manifest=None, metrics=None):
+    """
+    Extract, dedup and read the labels and SRT data of each folder through a pipeline,
+    so folders overlap across stages, then create the COCO dataset as create_coco does.
+
+    Args:
+    detect_df (pandas.DataFrame): DataFrame containing the archive and SRT paths of each folder.
+    args (argparse.Namespace): Namespace as passed to build_data, reduce_data_similarity and create_coco.
+    manifest (pp.RunManifest): Skip the stages already completed from unchanged inputs, or None to run all.
+    metrics (pp.Metrics): Records each stage of each folder, or None.
+
+    Returns:
+    dict: The counts of COCO records written, or None if the dataset was up to date
+    """
+    # without a manifest to resume from, an existing data path is kept as build_data keeps it
+    extract = manifest is not None or not args.data_path.exists() or args.overwrite_local_data
+    args.data_path.mkdir(exist_ok=True)
+    if manifest is not None:
+        seed_manifest(detect_df, args, manifest)
+    metrics = metrics or pp.Metrics(enabled=False)
+
+    remover = None
+    if Config.DEDUP_ON_EXTRACT:
+        remover = pp.DuplicateRemover(pd.DataFrame(), **dedup_settings())
+    extractor = pp.ArchiveExtractor(save_local=args.save_local_data,
+                                    keep_suffixes=Config.KEEP_SUFFIXES,
+                                    remover=remover)
+    LR = pp.LabelReader(threads=Config.LABEL_READ_THREADS)
+    SR = make_srt_reader(detect_df, args)
+    DR = open_remover(args)
+    frame_cache = open_frame_cache(args, manifest)
+
+    # each folder is processed once, with the rows of all its videos
+    detect_df = detect_df.reset_index(drop=True)
+    folders = [(name, rows.index.tolist())
+               for name, rows in detect_df.groupby(Config.name_col, sort=False)]
+
+    def measured(name, function):
+        # record each stage of each folder, the folder name leading every task
+        def stage(task):
+            with metrics.stage(name, task[0]):
+                return function(task)
+        return stage
+
+    def extract_stage(folder):
+        name, rows = folder
+        img_dir = args.data_path / name
+        zip_file = detect_df[Config.zip_col][rows[0]]
+        extracted_dups = None
+        if extract and (manifest is None or args.overwrite_local_data
+                        or not manifest.done(name, 'extract', extract_fingerprint(zip_file))):
+            report = extractor.extract(zip_file, args.data_path)
+            extracted_dups = report['duplicates'].get(str(img_dir))
+            if manifest is not None and report['ok']:
+                manifest.complete(name, 'extract', extract_fingerprint(zip_file), extracted_dups)
+            if img_dir.is_dir() and not any(img_dir.iterdir()):
+                os.rmdir(img_dir)
+        return name, rows, img_dir, extracted_dups
+
+    def dedup_stage(task):
+        name, rows, img_dir, extracted_dups = task
+        with metrics.stage('dedup', name) as record:
+            record['items'] = dedup_folder(DR, img_dir, extracted_dups, args, manifest)
+        return name, rows, img_dir
+
+    def label_stage(task):
+        name, rows, img_dir = task
+        # unchanged folders are only loaded from the frame cache if the dataset is rebuilt
+        fingerprint = frames_fingerprint(name, SR, args)
+        if frame_cache is not None and manifest.done(name, 'frames', fingerprint):
+            return name, fingerprint, None
+        return name, fingerprint, read_labels(name, LR, args)
+
+    def srt_stage(task):
+        name, fingerprint, label_df = task
+        if label_df is None:
+            return name, fingerprint, None
+        frames = label_df, read_srt(name, label_df, SR, srt_pool)
+        cache_frames(name, fingerprint, frames, manifest, frame_cache)
+        return name, fingerprint, frames
+
+    pipeline = pp.Pipeline([('extract', measured('extract', extract_stage), Config.PIPELINE_THREADS['extract']),
+                            ('dedup', dedup_stage, 1),
+                            ('labels', measured('labels', label_stage), Config.PIPELINE_THREADS['labels']),
+                            ('srt', measured('srt', srt_stage), Config.PIPELINE_THREADS['srt'])],
+                           queue_size=Config.PIPELINE_QUEUE_SIZE)
+    # fork the worker processes before the stage threads start
+    srt_pool = Pool(Config.SRT_PROCESSES) if Config.SRT_PROCESSES > 1 else None
+    try:
+        with pp.HashExecutor(DR,
+                             processes=Config.HASH_PROCESSES,
+                             chunksize=Config.HASH_CHUNKSIZE,
+                             min_pool_items=Config.HASH_MIN_POOL_ITEMS) as executor:
+            executor.start()
+            DR.executor = executor
+            results = pipeline.run(folders)
+    finally:
+        if srt_pool is not None:
+            srt_pool.close()
+            srt_pool.join()
+
+    # record the lookup rows in table order, whichever folder finished first
+    for name, _ in folders:
+        img_dir = str(args.data_path / name)
+        if img_dir in DR.lookup:
+            DR.lookup[img_dir] = DR.lookup.pop(img_dir)
+    close_remover(DR, args)
+
+    # other folders in the data path are read too, as create_coco reads them
+    fingerprints = {name: fingerprint for name, fingerprint, _ in results}
+    frames = {name: loaded for name, _, loaded in results if loaded is not None}
+    coco_names = coco_folders(detect_df, args)
+    for name in coco_names:
+        if name not in fingerprints:
+            fingerprints[name] = frames_fingerprint(name, SR, args)
+    fingerprint = coco_fingerprint(fingerprints, args)
+    if coco_up_to_date(manifest, fingerprint, args):
+        return None
+
+    for name in coco_names:
+        if name not in frames:
+            frames[name] = folder_frames(name, fingerprints[name], LR, SR, args, manifest, frame_cache)
+    label_df, srt_df = combine_frames(coco_names, frames, SR)
+
+    with metrics.stage('coco') as record:
+        counts = write_coco(label_df, srt_df, args)
+        record['items'] = counts['annotations']
+    if manifest is not None:
+        manifest.complete(None, 'coco', fingerprint)
+
+    return counts
+
 
 def save_data(args):
     """
@@ -223,10 +853,10 @@ def save_data(args):
         data_path (pathlib.Path): Path to the directory containing the data to be saved.
     """
     # remove all files in data besides yolo data and directories
-    keep_suffix = ['.jpg', '.txt', '']
-    other_files = [x for x in args.data_path.glob('*/*') if x.suffix not in keep_suffix]
+    keep_suffix = list(Config.KEEP_SUFFIXES) + ['']
+    other_files = [x for x in args.data_path.glob('*/*') if x.suffix.lower() not in keep_suffix]
     if len(other_files):
-        logging.info('Removing ', ', '.join(other_files))
+        logging.info('Removing ' + ', '.join(map(str, other_files)))
         for other_file in other_files:
             os.remove(other_file)
     else:
@@ -242,21 +872,49 @@ def main():
     Main function for the program
     """
     args = parse_args()
+    check_settings(args)
+    metrics = pp.Metrics(enabled=args.metrics_output is not None)
+    manifest = None
 
-    logging.info('Loading data.')
-    detect_df = load_data(args)
-
-    logging.info('Building data.')
-    build_data(detect_df, args)
-
-    logging.info('Reducing data similarity.')
-    reduce_data_similarity(detect_df, args)
-
-    logging.info('Extracting SRT dataframe.')
-    create_coco(detect_df, args)
-
-    logging.info('Saving data.')
-    save_data(args)
+    try:
+        logging.info('Loading data.')
+        with metrics.stage('load_data') as record:
+            detect_df = load_data(args)
+            record['items'] = len(detect_df)
+
+        manifest = open_manifest(args)
+        if Config.PIPELINE:
+            logging.info('Running the folder pipeline.')
+            with metrics.stage('pipeline') as record:
+                counts = run_pipeline(detect_df, args, manifest, metrics)
+                record['items'] = counts and counts['annotations']
+        else:
+            logging.info('Building data.')
+            with metrics.stage('build_data') as record:
+                extracted_dups = build_data(detect_df, args, manifest, metrics)
+                record['items'] = detect_df[Config.name_col].nunique()
+
+            logging.info('Reducing data similarity.')
+            with metrics.stage('reduce_data_similarity') as record:
+                reduce_data_similarity(detect_df, args, extracted_dups, manifest, metrics)
+                record['items'] = detect_df[Config.name_col].nunique()
+
+            logging.info('Extracting SRT dataframe.')
+            with metrics.stage('create_coco') as record:
+                counts = create_coco(detect_df, args, manifest)
+                record['items'] = counts and counts['annotations']
+
+        logging.info('Saving data.')
+        with metrics.stage('save_data'):
+            save_data(args)
+    finally:
+        # keep the stages completed since the last batched save, including failed runs
+        if manifest is not None:
+            manifest.save()
+        # write the metrics next to the coco output, including failed runs
+        if metrics.enabled:
+            args.data_path.mkdir(parents=True, exist_ok=True)
+            metrics.write(args.data_path / args.metrics_output)
 
 
 if __name__ == '__main__':
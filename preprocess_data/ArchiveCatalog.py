@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+import sqlite3
+import zipfile
+
+class ArchiveCatalog():
+    # sqlite catalog of source archives and their members, read from the zip central directory only
+    def __init__(self, path):
+        """
+        Initialize the ArchiveCatalog object, creating the database if needed.
+
+        Parameters:
+        path (str or pathlib.Path): The sqlite database file.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS archives (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                ok INTEGER NOT NULL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS members (
+                archive TEXT NOT NULL,
+                name TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                compress_size INTEGER NOT NULL,
+                crc INTEGER NOT NULL,
+                PRIMARY KEY (archive, name)
+            );""")
+        self.connection.commit()
+
+    def refresh(self, source_path, suffix='.zip'):
+        """
+        Catalog the archives in a directory, only reading those that are new or changed since the last refresh.
+
+        Parameters:
+        source_path (str or pathlib.Path): The directory holding the archives.
+        suffix (str): The suffix of the archives (default: '.zip').
+
+        Returns:
+        counts (dict): The number of archives 'unchanged', 'read' and 'removed' from the catalog.
+        """
+        start = time.perf_counter()
+        cataloged = {path: (size, mtime_ns) for path, size, mtime_ns in
+                     self.connection.execute('SELECT path, size, mtime_ns FROM archives')}
+
+        counts = {'unchanged': 0, 'read': 0, 'removed': 0}
+        found = set()
+        with os.scandir(source_path) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(suffix) or not entry.is_file():
+                    continue
+                path = os.path.abspath(entry.path)
+                stat = entry.stat()
+                found.add(path)
+                if cataloged.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    counts['unchanged'] += 1
+                    continue
+                self._read_archive(path, stat)
+                counts['read'] += 1
+
+        # forget archives that no longer exist
+        removed = [(path,) for path in cataloged if path not in found
+                   and os.path.dirname(path) == os.path.abspath(source_path)]
+        self.connection.executemany('DELETE FROM archives WHERE path = ?', removed)
+        self.connection.executemany('DELETE FROM members WHERE archive = ?', removed)
+        self.connection.commit()
+        counts['removed'] = len(removed)
+
+        logging.info(f'Refreshed the archive catalog of {source_path} in {time.perf_counter() - start:.2f}s: '
+                     f'{counts["read"]} read, {counts["unchanged"]} unchanged, {counts["removed"]} removed')
+
+        return counts
+
+    def summarise(self, paths, keep_suffixes=None, label_suffix='.txt'):
+        """
+        Summarise archives from the catalog without opening them.
+
+        Parameters:
+        paths (list): The archive paths.
+        keep_suffixes (tuple): Count only members with these suffixes towards the extracted bytes
+            (default: None for every member).
+        label_suffix (str): The suffix of the label members (default: '.txt').
+
+        Returns:
+        summaries (list): For each path, a dict with its 'status' ('ok', 'missing', 'bad' or 'unlabelled'),
+            'members', 'labels', 'bytes' of members extracted and 'compressed' bytes read to extract them.
+        """
+        if keep_suffixes is not None:
+            keep_suffixes = {suffix.lower() for suffix in keep_suffixes}
+
+        summaries = []
+        for path in paths:
+            path = os.path.abspath(path)
+            row = self.connection.execute('SELECT ok, error FROM archives WHERE path = ?', (path,)).fetchone()
+            summary = {'path': path, 'status': 'missing', 'members': 0, 'labels': 0,
+                       'bytes': 0, 'compressed': 0}
+            if row is None:
+                summaries.append(summary)
+                continue
+            if not row[0]:
+                summary['status'] = 'bad'
+                summaries.append(summary)
+                continue
+
+            for name, file_size, compress_size in self.connection.execute(
+                    'SELECT name, file_size, compress_size FROM members WHERE archive = ?', (path,)):
+                summary['members'] += 1
+                suffix = os.path.splitext(name)[1].lower()
+                if suffix == label_suffix:
+                    summary['labels'] += 1
+                if keep_suffixes is None or suffix in keep_suffixes:
+                    summary['bytes'] += file_size
+                    summary['compressed'] += compress_size
+            summary['status'] = 'ok' if summary['labels'] else 'unlabelled'
+            summaries.append(summary)
+
+        return summaries
+
+    def members(self, path):
+        """
+        List the cataloged members of an archive as (name, file_size, crc) tuples.
+        """
+        return self.connection.execute(
+            'SELECT name, file_size, crc FROM members WHERE archive = ? ORDER BY name',
+            (os.path.abspath(path),)).fetchall()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        self.connection.close()
+
+    def _read_archive(self, path, stat):
+        """
+        Replace the catalog entry of an archive with its central directory.
+        """
+        rows, ok, error = [], 1, None
+        try:
+            with zipfile.ZipFile(path) as zf:
+                rows = [(path, info.filename, info.file_size, info.compress_size, info.CRC)
+                        for info in zf.infolist() if not info.is_dir()]
+        except (zipfile.BadZipFile, OSError) as e:
+            ok, error = 0, str(e)
+
+        self.connection.execute('DELETE FROM members WHERE archive = ?', (path,))
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO members (archive, name, file_size, compress_size, crc) VALUES (?, ?, ?, ?, ?)',
+            rows)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO archives (path, size, mtime_ns, ok, error) VALUES (?, ?, ?, ?, ?)',
+            (path, stat.st_size, stat.st_mtime_ns, ok, error))
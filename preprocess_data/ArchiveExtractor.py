@@ -0,0 +1,210 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import zipfile
+import patoolib
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+class ArchiveExtractor():
+    # extracts several archives at once, natively for zips and through patool otherwise
+    def __init__(self, workers=4, save_local=False, keep_suffixes=None, remover=None, scratch_dir=None):
+        """
+        Initialize the ArchiveExtractor object.
+
+        Parameters:
+        workers (int): The number of archives extracted at the same time (default: 4).
+        save_local (bool): Copy each archive to its own temporary file before extracting it (default: False).
+        keep_suffixes (tuple): Only extract files with these suffixes, plus directories (default: None for all).
+        remover (DuplicateRemover): Hash the images of each zip folder from the archive and skip writing
+            duplicates and their labels (default: None to extract every image).
+        scratch_dir (str or pathlib.Path): The directory holding local copies and archives extracted aside
+            by patool, kept apart from the output directory (default: None for the system temporary directory).
+        """
+        self.workers = workers
+        self.save_local = save_local
+        self.keep_suffixes = None if keep_suffixes is None else {s.lower() for s in keep_suffixes}
+        self.remover = remover
+        self.scratch_dir = scratch_dir
+
+    def extract_all(self, archives, outdir):
+        """
+        Extract every archive into the output directory.
+
+        Parameters:
+        archives (list): The paths of the archives.
+        outdir (pathlib.Path): The directory the archives are extracted into.
+
+        Returns:
+        reports (list): One report per archive, in the order given, as returned by extract.
+        """
+        Path(outdir).mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(self.workers) as executor:
+            reports = list(executor.map(lambda archive: self.extract(archive, outdir), archives))
+
+        # summarise the extraction
+        extracted = [report for report in reports if report['ok']]
+        n_bytes = sum(report['bytes_written'] for report in extracted)
+        n_skipped = sum(report['bytes_skipped'] for report in extracted)
+        n_deduped = sum(report['bytes_deduped'] for report in extracted)
+        logging.info(f'Successfully extracted {len(extracted)} of {len(reports)} archives '
+                     f'({n_bytes / 1e6:.1f} MB, {n_skipped / 1e6:.1f} MB of filtered members and '
+                     f'{n_deduped / 1e6:.1f} MB of duplicates skipped)')
+
+        return reports
+
+    def extract(self, archive, outdir):
+        """
+        Extract a single archive, logging its timing and byte counts instead of raising.
+
+        Parameters:
+        archive (str): The path of the archive.
+        outdir (pathlib.Path): The directory the archive is extracted into.
+
+        Returns:
+        report (dict): The 'archive', whether it was extracted ('ok'), 'seconds', 'members',
+        'bytes_read', 'bytes_written', the names and total size of the filtered members
+        ('skipped', 'bytes_skipped'), and with a remover the duplicate list of each deduped
+        folder ('duplicates') and the size of the duplicate members not written ('bytes_deduped').
+        """
+        report = {'archive': str(archive), 'ok': False, 'seconds': 0.0,
+                  'members': 0, 'bytes_read': 0, 'bytes_written': 0,
+                  'skipped': [], 'bytes_skipped': 0,
+                  'duplicates': {}, 'bytes_deduped': 0}
+        start = time.perf_counter()
+        local_copy = None
+        try:
+            report['bytes_read'] = os.path.getsize(archive)
+            source = archive
+            if self.save_local:
+                local_copy = self._local_copy(archive)
+                source = local_copy
+
+            if Path(archive).suffix.lower() == '.zip':
+                self._extract_zip(source, outdir, report)
+            else:
+                self._extract_patool(source, outdir, report)
+            report['ok'] = True
+        except Exception as error:
+            report['error'] = str(error)
+        finally:
+            if local_copy is not None:
+                os.remove(local_copy)
+        report['seconds'] = time.perf_counter() - start
+
+        if report['ok']:
+            logging.info(f'Extracted {archive}: {report["members"]} members, '
+                         f'{report["bytes_read"] / 1e6:.1f} MB read, {report["bytes_written"] / 1e6:.1f} MB '
+                         f'written, {len(report["skipped"])} members ({report["bytes_skipped"] / 1e6:.1f} MB) '
+                         f'skipped in {report["seconds"]:.2f}s')
+        else:
+            logging.info(f'Skipping {archive} after {report["seconds"]:.2f}s: {report["error"]}')
+
+        return report
+
+    def _local_copy(self, archive):
+        """
+        Copy an archive to a temporary file of its own, keeping its suffix for format detection.
+        """
+        handle, local_copy = tempfile.mkstemp(suffix=Path(archive).suffix, dir=self.scratch_dir)
+        os.close(handle)
+        shutil.copyfile(archive, local_copy)
+
+        return local_copy
+
+    def keep(self, name):
+        """
+        Whether an archive member passes the suffix allow-list, directories always passing.
+        """
+        if self.keep_suffixes is None or name.endswith('/'):
+            return True
+
+        return os.path.splitext(name)[1].lower() in self.keep_suffixes
+
+    def _extract_zip(self, archive, outdir, report):
+        """
+        Extract the allowed members of a zip with the standard library, filling in the report.
+        """
+        with zipfile.ZipFile(archive) as zf:
+            members = []
+            for member in zf.infolist():
+                if self.keep(member.filename):
+                    members.append(member)
+                else:
+                    report['skipped'].append(member.filename)
+                    report['bytes_skipped'] += member.file_size
+            if self.remover is not None:
+                members = self._dedup_members(zf, members, outdir, report)
+
+            # create the folders first, as archives extracted at the same time may share them
+            folders = set()
+            for member in members:
+                name = member.filename.rstrip('/')
+                folders.add(name if member.is_dir() else os.path.dirname(name))
+            for folder in folders:
+                parts = [part for part in folder.split('/') if part not in ('', '.', '..')]
+                os.makedirs(os.path.join(outdir, *parts), exist_ok=True)
+            zf.extractall(outdir, members)
+
+        report['members'] = len(members)
+        report['bytes_written'] = sum(member.file_size for member in members)
+
+    def _dedup_members(self, zf, members, outdir, report):
+        """
+        Hash the images of each folder in a zip and drop duplicate images and their labels from the members.
+
+        Images are decoded one at a time from the archive in sorted name order, matching the order
+        DuplicateRemover.remove_duplicates lists them on disk, so the duplicate lists are the same.
+        """
+        folders = {}
+        for member in members:
+            if self.remover.is_image(member.filename):
+                folder, _ = os.path.split(member.filename)
+                folders.setdefault(folder, []).append(member)
+
+        drop = set()
+        for folder, images in folders.items():
+            images.sort(key=lambda member: member.filename)
+            hashes = self.remover.hash_bytes(zf.read(member) for member in images)
+            dup_list = self.remover.match_hashes(hashes, [member.filename for member in images])
+            report['duplicates'][str(Path(outdir) / folder)] = dup_list
+
+            # drop each duplicate image with its label
+            for index, _ in dup_list:
+                stem = os.path.splitext(images[index].filename)[0]
+                drop.update((images[index].filename, stem + '.txt'))
+
+        kept = []
+        for member in members:
+            if member.filename in drop:
+                report['bytes_deduped'] += member.file_size
+            else:
+                kept.append(member)
+
+        return kept
+
+    def _extract_patool(self, archive, outdir, report):
+        """
+        Extract any other archive format with patool, filling in the report.
+        """
+        # extract aside to count and filter the files, then move the allowed ones into place
+        Path(outdir).mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.scratch_dir) as temp_dir:
+            patoolib.extract_archive(str(archive), outdir=temp_dir, verbosity=-1)
+            for root, _, files in os.walk(temp_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    relpath = os.path.relpath(path, temp_dir)
+                    size = os.path.getsize(path)
+                    if not self.keep(relpath):
+                        report['skipped'].append(relpath)
+                        report['bytes_skipped'] += size
+                        continue
+                    report['members'] += 1
+                    report['bytes_written'] += size
+                    target = os.path.join(outdir, relpath)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
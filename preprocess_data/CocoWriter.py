@@ -0,0 +1,151 @@
+import os
+import json
+
+class CocoWriter():
+    # writes COCO json incrementally from DF2Coco record generators
+    def __init__(self, indent=None):
+        """
+        Initialize the CocoWriter object.
+
+        Args:
+        indent (int): indentation of the json output, matching json.dump, or None for compact output.
+        """
+        self.indent = indent
+        if indent is None:
+            self.encoder = json.JSONEncoder(separators=(',', ':'))
+        else:
+            self.encoder = json.JSONEncoder(indent=indent)
+
+    def write(self, path, df2coco, data_input):
+        """
+        Convert a dataframe of labels and stream it to a COCO json file
+
+        Parameters:
+        path: file path of the json output
+        df2coco: DF2Coco object generating the records
+        data_input: dataframe of labels, as passed to DF2Coco.convert_df
+
+        Returns:
+        counts: dictionary with the number of 'images', 'categories' and 'annotations' written
+        """
+        columns = df2coco.build_columns(data_input)
+        sections = [('images', df2coco.iter_images(columns)),
+                    ('categories', df2coco.iter_categories(columns)),
+                    ('annotations', df2coco.iter_annotations(columns))]
+
+        return self.write_sections(path, sections, df2coco._gen_info())
+
+    def write_shards(self, path, df2coco, data_input, shard_by='folder', shard_size=100000,
+                     folder_col='labelling_foldername'):
+        """
+        Convert a dataframe of labels and stream it to several COCO json shards with a manifest
+
+        Shards are written next to path as <name>_00000.json, with the manifest at <name>_manifest.json
+        recording the file, folders, counts and id ranges of each shard.
+
+        Parameters:
+        path: file path the shard and manifest names are derived from
+        df2coco: DF2Coco object generating the records
+        data_input: dataframe of labels, as passed to DF2Coco.convert_df
+        shard_by: 'folder' for one shard per folder, or 'annotations' for shards of about shard_size annotations
+        shard_size: number of annotations per shard when sharding by annotations
+        folder_col: column holding the folder name of each row
+
+        Returns:
+        manifest: dictionary written to the manifest file
+        """
+        columns = df2coco.build_columns(data_input)
+        shards = df2coco.split_columns(columns, data_input, shard_by, shard_size, folder_col)
+        stem, _ = os.path.splitext(path)
+        info = df2coco._gen_info()
+
+        manifest = {'shard_by': shard_by,
+                    'categories': list(df2coco.iter_categories(columns)),
+                    'info': info,
+                    'shards': []}
+        for number, (folders, shard_columns) in enumerate(shards):
+            shard_path = f'{stem}_{number:05d}.json'
+            sections = [('images', df2coco.iter_images(shard_columns)),
+                        ('categories', df2coco.iter_categories(shard_columns)),
+                        ('annotations', df2coco.iter_annotations(shard_columns))]
+            counts = self.write_sections(shard_path, sections, info)
+
+            image_ids = shard_columns['images']['id']
+            annotation_ids = shard_columns['annotations']['id']
+            manifest['shards'].append({
+                'file': os.path.basename(shard_path),
+                'folders': folders,
+                'images': counts['images'],
+                'annotations': counts['annotations'],
+                'image_ids': [min(image_ids), max(image_ids)] if image_ids else None,
+                'annotation_ids': [min(annotation_ids), max(annotation_ids)] if annotation_ids else None})
+
+        with open(self.manifest_path(path), 'w') as f:
+            json.dump(manifest, f, indent=self.indent)
+
+        return manifest
+
+    def manifest_path(self, path):
+        """
+        File path of the shard manifest write_shards writes for a path
+        """
+        stem, _ = os.path.splitext(path)
+
+        return f'{stem}_manifest.json'
+
+    def write_sections(self, path, sections, info):
+        """
+        Stream record generators to a COCO json file
+
+        Parameters:
+        path: file path of the json output
+        sections: list of (key, records) pairs, written in order
+        info: dictionary written under the 'info' key
+
+        Returns:
+        counts: dictionary with the number of records written for each key
+        """
+        counts = {}
+        with open(path, 'w') as f:
+            f.write('{')
+            for key, records in sections:
+                f.write(self._newline(1) + json.dumps(key) + self._colon() + '[')
+                count = 0
+                for record in records:
+                    if count:
+                        f.write(',')
+                    f.write(self._newline(2) + self._encode(record, 2))
+                    count += 1
+                if count:
+                    f.write(self._newline(1))
+                f.write('],')
+                counts[key] = count
+            f.write(self._newline(1) + json.dumps('info') + self._colon() + self._encode(info, 1))
+            f.write(self._newline(0) + '}')
+
+        return counts
+
+    def _encode(self, value, level):
+        """
+        Encode a value nested at the given indentation level
+        """
+        text = self.encoder.encode(value)
+        if self.indent is None:
+            return text
+
+        return text.replace('\n', self._newline(level))
+
+    def _newline(self, level):
+        """
+        Line break and indentation for a nesting level, nothing when compact
+        """
+        if self.indent is None:
+            return ''
+
+        return '\n' + ' ' * (self.indent * level)
+
+    def _colon(self):
+        """
+        Key separator matching json.dump
+        """
+        return ':' if self.indent is None else ': '
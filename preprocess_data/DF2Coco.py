@@ -1,6 +1,13 @@
+import numpy as np
 import pandas as pd
 
 class DF2Coco():
+    # image fields and the dataframe column each is read from
+    image_fields = {'height': 'height', 'width': 'width', 'id': 'fileid', 'file_name': 'filename',
+                    'latitude': 'latitude', 'longitude': 'longitude', 'rel_alt': 'rel_alt',
+                    'abs_alt': 'abs_alt', 'yaw': 'Yaw', 'pitch': 'Pitch', 'roll': 'Roll',
+                    'timestamp': 'timestamp'}
+
     def __init__(self, version='', date_created='', year=''):
         """
         Initialize the DF2Coco object.
@@ -17,84 +24,160 @@ class DF2Coco():
     def convert_df(self, data_input):
         """
         Convert dataframe of labels to COCO format
-        
+
         Parameters:
         data_input: dataframe of labels, containing columns 'filename', 'class', 'xmin', 'ymin', 'xmax', 'ymax'
-        
+
         Returns:
         data_coco: COCO format data, containing keys 'images', 'categories', 'annotations', and 'info'
         """
-        data = data_input.copy()
-        data['fileid'] = data['filename'].astype('category').cat.codes
-        data['categoryid'] = pd.Categorical(data['class'], ordered=True).codes + 1
-        data['annid'] = data.index
-
-        annotations = [self._gen_annotation(row) for row in data.itertuples()]
-
-        imagedf = data.drop_duplicates(subset=['fileid']).sort_values(by='fileid')
-        images = [self._gen_image(row) for row in imagedf.itertuples()]
-
-        catdf = data.drop_duplicates(subset=['categoryid']).sort_values(by='categoryid')
-        categories = [self._gen_category(row) for row in catdf.itertuples()]
+        columns = self.build_columns(data_input)
 
         data_coco = {}
-        data_coco['images'] = images
-        data_coco['categories'] = categories
-        data_coco['annotations'] = annotations
+        data_coco['images'] = list(self.iter_images(columns))
+        data_coco['categories'] = list(self.iter_categories(columns))
+        data_coco['annotations'] = list(self.iter_annotations(columns))
         data_coco['info'] = self._gen_info()
 
         return data_coco
 
-    def _gen_image(self, row):
-        """
-        Match row fields to a dictionary field for image
-        """
-        # populate image info
-        image = {
-            'height': row.height,
-            'width': row.width,
-            'id': row.fileid,
-            'file_name': row.filename,
-            'latitude': row.latitude,
-            'longitude': row.longitude if 'longitude' in row else row.longtitude,
-            'rel_alt': row.rel_alt,
-            'abs_alt': row.abs_alt,
-            'yaw': row.Yaw,
-            'pitch': row.Pitch,
-            'roll': row.Roll,
-            'timestamp': row.timestamp,
-        }
-        
-        return image
+    def build_columns(self, data_input):
+        """
+        Compute every COCO field as a whole column, without building any records
+
+        Parameters:
+        data_input: dataframe of labels, as passed to convert_df
 
-    def _gen_category(self, row):
+        Returns:
+        columns: dictionary with 'images', 'categories' and 'annotations' keys, each mapping field names
+        to lists of python values
         """
-        Match row fields to a dictionary field for category
+        fileid = pd.Categorical(data_input['filename']).codes
+        categoryid = pd.Categorical(data_input['class'], ordered=True).codes
+
+        # the first row of each image and category, in id order
+        _, first_image = np.unique(fileid, return_index=True)
+        _, first_category = np.unique(categoryid, return_index=True)
+
+        # image fields from the first row of each image
+        image_rows = data_input.iloc[first_image]
+        images = {}
+        for field, column in self.image_fields.items():
+            if column == 'fileid':
+                images[field] = fileid[first_image].tolist()
+            elif column == 'timestamp':
+                images[field] = self._format_timestamps(image_rows[column])
+            elif column == 'longitude' and column not in data_input:
+                images[field] = image_rows['longtitude'].tolist()
+            else:
+                images[field] = image_rows[column].tolist()
+
+        categories = {'id': categoryid[first_category].tolist(),
+                      'name': data_input.iloc[first_category, 0].tolist()}
+
+        annotations = {'area': (data_input['w'] * data_input['h']).tolist(),
+                       'image_id': fileid.tolist(),
+                       'bbox': data_input[['x', 'y', 'w', 'h']].to_numpy().tolist(),
+                       'category_id': categoryid.tolist(),
+                       'id': data_input.index.tolist()}
+
+        return {'images': images, 'categories': categories, 'annotations': annotations}
+
+    def split_columns(self, columns, data_input, shard_by='folder', shard_size=100000,
+                      folder_col='labelling_foldername'):
         """
-        category = {
-            'supercategory': 'Animals',
-             'id': row.categoryid - 1,                           
-             'name': row[1]
-             }
+        Split the columns returned by build_columns into self-consistent shards
+
+        Each shard holds whole images with all of their annotations and the full category table,
+        keeping the image and annotation ids of the unsplit dataset.
 
-        return category
+        Parameters:
+        columns: columns returned by build_columns for data_input
+        data_input: dataframe of labels, as passed to build_columns
+        shard_by: 'folder' for one shard per folder, or 'annotations' to fill shards with about shard_size annotations
+        shard_size: number of annotations per shard when sharding by annotations
+        folder_col: column holding the folder name of each row
+
+        Returns:
+        shards: list of (folders, shard_columns) pairs, with the folder names in each shard
+        """
+        image_ids = np.array(columns['images']['id'], dtype=np.int64)
+        annotation_image = np.searchsorted(image_ids, columns['annotations']['image_id'])
+
+        # folder of the first row of each image
+        fileid = pd.Categorical(data_input['filename']).codes
+        _, first_image = np.unique(fileid, return_index=True)
+        image_folder = data_input[folder_col].to_numpy()[first_image]
+
+        # assign every image to a shard
+        if shard_by == 'folder':
+            _, image_shard = np.unique(image_folder.astype(str), return_inverse=True)
+        elif shard_by == 'annotations':
+            counts = np.bincount(annotation_image, minlength=len(image_ids))
+            image_shard = (np.cumsum(counts) - counts) // shard_size
+        else:
+            raise ValueError(f'Unknown shard_by: {shard_by}')
+        annotation_shard = image_shard[annotation_image]
+
+        shards = []
+        for shard in np.unique(image_shard):
+            image_idx = np.nonzero(image_shard == shard)[0].tolist()
+            annotation_idx = np.nonzero(annotation_shard == shard)[0].tolist()
+            shard_columns = {
+                'images': {field: [values[i] for i in image_idx]
+                           for field, values in columns['images'].items()},
+                'categories': columns['categories'],
+                'annotations': {field: [values[i] for i in annotation_idx]
+                                for field, values in columns['annotations'].items()}}
+            folders = sorted(set(image_folder[image_idx].astype(str).tolist()))
+            shards.append((folders, shard_columns))
+
+        return shards
+
+    def iter_images(self, columns):
+        """
+        Generate the image records from the columns returned by build_columns
+        """
+        images = columns['images']
+        for values in zip(*images.values()):
+            yield dict(zip(images.keys(), values))
+
+    def iter_categories(self, columns):
+        """
+        Generate the category records from the columns returned by build_columns
+        """
+        categories = columns['categories']
+        for categoryid, name in zip(categories['id'], categories['name']):
+            yield {'supercategory': 'Animals', 'id': categoryid, 'name': name}
+
+    def iter_annotations(self, columns):
+        """
+        Generate the annotation records from the columns returned by build_columns
+        """
+        annotations = columns['annotations']
+        for area, fileid, bbox, categoryid, annid in zip(*annotations.values()):
+            yield {
+                'segmentation': [],
+                'iscrowd': 0,
+                'area': area,
+                'image_id': fileid,
+                'bbox': bbox,
+                'category_id': categoryid,
+                'id': annid
+                }
 
-    def _gen_annotation(self, row):
+    def _format_timestamps(self, timestamps):
         """
-        Match row fields to a dictionary field for annotation
+        Convert parsed timestamps back to the SRT text format, keeping text timestamps unchanged
         """
-        area = row.w * row.h
-        annotation = {
-            'segmentation': [],
-            'iscrowd': 0,
-            'area': area,
-            'image_id': row.fileid,
-            'bbox': [row.x, row.y, row.w, row.h],
-            'category_id': row.categoryid - 1,
-            'id': row.annid
-            }
+        if pd.api.types.is_datetime64_any_dtype(timestamps):
+            # milliseconds, or microseconds when the SRT recorded them
+            text = timestamps.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+            if not (timestamps.dt.microsecond % 1000).any():
+                text = text.str[:-3]
+            return [value if isinstance(value, str) else None for value in text.tolist()]
 
-        return annotation
+        return timestamps.tolist()
 
     def _gen_info(self):
         """
@@ -106,4 +189,4 @@ class DF2Coco():
             'date_created': self.date_created
         }
 
-        return info
\ No newline at end of file
+        return info
@@ -1,14 +1,29 @@
+import io
 import os
+import ast
 import logging
+import numpy as np
 import pandas as pd
 
-from multiprocessing.pool import Pool
-from glob import glob
+from collections import deque
+from pathlib import Path
 from PIL import Image
 
+from .HammingIndex import HammingIndex, hamming_distance
+from .HashExecutor import HashExecutor
+from .PerceptualHash import dhash_batch, dhash_to_int, hash_batch, hash_bits, hash_grids
+
 class DuplicateRemover():
+    # suffix of the images deduped, matched case-insensitively
+    image_suffix = '.jpg'
+    # order of the image list the lookup table indices point into, tables without it used unsorted glob order
+    lookup_order = 'sorted'
+
     def __init__(self, lookup_df, remove=True, df_write=True, 
-                 resample=1, fill_color='white'):
+                 resample=1, fill_color='white', threshold=0,
+                 strategy='index', window_size=30, hash_store=None,
+                 remove_cross=False, hash_cache=None, fast_hash=False,
+                 executor=None, hash_algos=('dhash',)):
         """
         Initialize the DuplicateRemover object.
 
@@ -18,40 +33,187 @@ class DuplicateRemover():
         df_write (bool): A flag to indicate whether to write the processed dataframe to a file.
         resample (int): An integer representing the resampling rate of the image.
         fill_color (str): A string representing the color to fill the image with before resampling.
+        threshold (int): The maximum hamming distance between two hashes to count as duplicates (default: 0 for exact matches).
+        strategy (str): The duplicate matching strategy, 'index' to compare against every kept image in the folder
+            or 'window' to compare only against the most recently kept frames (default: 'index').
+        window_size (int): The number of recently kept frames compared against with the 'window' strategy (default: 30).
+        hash_store (HashStore): A global store of hashes used to find duplicates across folders (default: None).
+        remove_cross (bool): A flag to indicate whether to remove images duplicated in another folder of the hash store.
+        hash_cache (HashCache): A per-image hash cache, so only new or changed images are hashed and duplicates
+            are always recomputed from hashes instead of read from the lookup table (default: None).
+        fast_hash (bool): A flag to decode JPEG images straight to grayscale at 1/8 scale before resizing,
+            which is much faster but may flip a few hash bits compared to a full decode (default: False).
+        executor (HashExecutor): A long-lived pool used to decode images for hashing, reused across folders
+            (default: None to start a pool for each folder).
+        hash_algos (tuple): The registered perceptual hashes computed from each decoded image, concatenated
+            in order into a single hash (default: ('dhash',)).
         """
+        if strategy not in ('index', 'window'):
+            raise ValueError(f'Unknown duplicate strategy: {strategy}')
         self.lookup_df = lookup_df
         self.remove = remove
         self.df_write = df_write
         self.resample = resample
         self.fill_color = fill_color
+        self.threshold = threshold
+        self.strategy = strategy
+        self.window_size = window_size
+        self.hash_store = hash_store
+        self.remove_cross = remove_cross
+        self.hash_cache = hash_cache
+        self.fast_hash = fast_hash
+        self.executor = executor
+        self.hash_algos = tuple(hash_algos)
+        hash_grids(self.hash_algos)
+        if hash_store is not None and hash_bits(self.hash_algos) > hash_store.bits:
+            raise ValueError(f'{"+".join(self.hash_algos)} hashes do not fit the {hash_store.bits} bit hash store')
+        self.cross_duplicates = []
 
-    def remove_duplicates(self, img_dir):
+    @property
+    def lookup_df(self):
+        """
+        The lookup table as a DataFrame of image directories, their stringified duplicate lists
+        and the order of the image list the duplicate indices point into.
+        """
+        return pd.DataFrame({'img_dir': list(self.lookup.keys()),
+                             'dup_list': [str(dup_list) for dup_list in self.lookup.values()],
+                             'order': self.lookup_order},
+                            columns=['img_dir', 'dup_list', 'order'])
+
+    @lookup_df.setter
+    def lookup_df(self, lookup_df):
+        # index the lookup table by image directory
+        self.lookup = {}
+        if 'img_dir' not in lookup_df or 'dup_list' not in lookup_df:
+            return
+
+        # indices into another image order would remove the wrong images, so those folders are deduped again
+        orders = lookup_df['order'] if 'order' in lookup_df else pd.Series(None, index=lookup_df.index)
+        current = (orders == self.lookup_order).to_numpy()
+        if not current.all():
+            logging.warning(f'Ignoring {(~current).sum()} lookup rows indexed in another image order, '
+                            f'their folders are deduped again')
+        lookup_df = lookup_df[current]
+        for img_dir, dup_list in zip(lookup_df['img_dir'], lookup_df['dup_list']):
+            if isinstance(dup_list, str):
+                dup_list = ast.literal_eval(dup_list)
+            # tables written one pair per row hold a single (int, int) tuple
+            if len(dup_list) == 2 and all(isinstance(i, int) for i in dup_list):
+                dup_list = [dup_list]
+            self.lookup.setdefault(str(img_dir), []).extend(tuple(pair) for pair in dup_list)
+
+    def __getstate__(self):
+        # workers only need the hashing settings, not the lookup table, store or cache
+        state = self.__dict__.copy()
+        for name in ('lookup', 'hash_store', 'hash_cache', 'executor', 'cross_duplicates'):
+            state.pop(name, None)
+
+        return state
+
+    def remove_duplicates(self, img_dir, extracted_dups=None):
         """
         Remove duplicate images and their corresponding label files from a directory.
 
         Parameters:
         img_dir (str): The path to the directory containing the images and labels.
+        extracted_dups (list): The duplicates already dropped while extracting the folder, which are only
+            recorded in the lookup table (default: None to find them in the directory).
+
+        Returns:
+        (int): The number of images in the directory that were checked.
         """
         # iterate through a glob directory and remove duplicates
-        # create list of images and labels
-        img_list = list(img_dir.glob('*.jpg'))
+        # create list of images and labels, sorted so indices are reproducible
+        img_list = sorted(path for path in img_dir.glob('*') if self.is_image(path.name))
         txt_list = [os.path.splitext(img)[0]+'.txt' for img in img_list]
         
-        if str(img_dir) in self.lookup_df.img_dir.tolist():
-            dup_list = self.lookup_df[self.lookup_df.img_dir==img_dir].dup_list.values[0]
-            dup_list = eval(dup_list)
+        hashes = None
+        if extracted_dups is not None:
+            self.lookup[str(img_dir)] = extracted_dups
+            dup_list = []
+        elif self.hash_cache is None and str(img_dir) in self.lookup:
+            dup_list = self.lookup[str(img_dir)]
             logging.info(f'Found {len(dup_list)} duplicates in {len(img_list)} from lookup table')
         else:
-            dup_list = self.find_duplicates(img_list)
-            new_row = pd.DataFrame({'img_dir':img_dir, 'dup_list':dup_list})
-            self.lookup_df = pd.concat([self.lookup_df, new_row])
+            hashes = self.make_hashes(img_list)
+            dup_list = self.match_hashes(hashes, img_list)
+            self.lookup[str(img_dir)] = dup_list
+
+        # check the remaining images against the other folders
+        remove_list = [index[0] for index in dup_list]
+        if self.hash_store is not None:
+            cross_list = self.find_cross_duplicates(img_dir, img_list, hashes, remove_list)
+            if self.remove_cross:
+                remove_list.extend(cross_list)
 
         # remove files in the duplicate list
         if self.remove:
-            for index in dup_list:
-                os.remove(img_list[index[0]])
-                os.remove(txt_list[index[0]])
+            for index in remove_list:
+                os.remove(img_list[index])
+                os.remove(txt_list[index])
+
+        return len(img_list)
+
+    def is_image(self, name):
+        """
+        Whether a file or archive member name is an image to dedup.
+
+        Parameters:
+        name (str): The file name or path.
+
+        Returns:
+        (bool): True if the name ends with the image suffix, in any case.
+        """
+        return os.path.splitext(name)[1].lower() == self.image_suffix
+
+    def find_cross_duplicates(self, img_dir, img_list, hashes=None, skip_list=[]):
+        """
+        Find images duplicated in other folders of the hash store, then add the folder to the store.
+
+        Parameters:
+        img_dir (pathlib.Path): The path to the directory containing the images.
+        img_list (list): A list of paths to the images in the directory.
+        hashes (list): The dhash of each image, computed if not given.
+        skip_list (list): Indices of images already found to be duplicates within the folder.
+
+        Returns:
+        A list of integers representing the indices of the images duplicated in another folder.
+        """
+        folder = img_dir.name
+        if self.hash_store.has_folder(folder):
+            logging.info(f'{folder} is already in the hash store')
+            return []
+
+        if hashes is None:
+            hashes = self.make_hashes(img_list)
+        skip = set(skip_list)
+        keep_list = [idx for idx in range(len(img_list)) if idx not in skip]
+
+        # report the closest match of each image in another folder
+        cross_list = []
+        matches = self.hash_store.query([hashes[idx] for idx in keep_list],
+                                        self.threshold, exclude_folder=folder)
+        for query_idx, dup_folder, dup_frame, distance in matches:
+            idx = keep_list[query_idx]
+            if cross_list and cross_list[-1] == idx:
+                continue
+            cross_list.append(idx)
+            self.cross_duplicates.append({'img_dir': str(img_dir),
+                                          'frame': _frame_number(img_list[idx], idx),
+                                          'dup_folder': dup_folder,
+                                          'dup_frame': dup_frame,
+                                          'distance': distance})
+        logging.info(f'Found {len(cross_list)} duplicates of {folder} in other folders.')
+
+        # add the remaining images to the store
+        if self.remove_cross:
+            skip.update(cross_list)
+        keep_list = [idx for idx in keep_list if idx not in skip]
+        self.hash_store.add(folder,
+                            [_frame_number(img_list[idx], idx) for idx in keep_list],
+                            [hashes[idx] for idx in keep_list])
 
+        return cross_list
 
     def find_duplicates(self, img_list):
         """
@@ -63,21 +225,154 @@ class DuplicateRemover():
         Returns:
         A list of tuples [(int, int)] representing the indices of the duplicate images in the input list.
         """
-        # initialize multiprocessing
+        hashes = self.make_hashes(img_list)
+
+        return self.match_hashes(hashes, img_list)
+
+    def match_hashes(self, hashes, img_list=None):
+        """
+        Find duplicate hashes within a list of image hashes.
+
+        With a threshold above zero, each hash is matched against the closest previously
+        kept hash within the threshold using a HammingIndex.
+
+        Parameters:
+        hashes (list): A list of integers representing the dhash of each image.
+        img_list (list): The image paths matching the hashes, used to order frames for the 'window' strategy.
+
+        Returns:
+        A list of tuples [(int, int)] representing the indices of the duplicate hashes in the input list.
+        """
+        if self.strategy == 'window':
+            return self._match_window(hashes, img_list)
+
         duplicates_list = []
-        hash_keys = dict()
-        with Pool() as pool:
-            results = pool.map_async(self._make_hash, img_list)
-            for idx, filehash in enumerate(results.get()):
+        if self.threshold:
+            # index only the bits the hashes use, so unused high bits do not match every hash
+            index = HammingIndex(self.threshold, hash_bits(self.hash_algos))
+            for idx, filehash in enumerate(hashes):
+                # check if a near duplicate has already been kept
+                match = index.nearest(filehash)
+                if match is None:
+                    index.add(filehash, idx)
+                else:
+                    duplicates_list.append((idx, match))
+        else:
+            hash_keys = dict()
+            for idx, filehash in enumerate(hashes):
                 # check if the filehash is unique
                 if filehash not in hash_keys:
                     hash_keys[filehash]=idx
                 else:
                     duplicates_list.append((idx,hash_keys[filehash]))
-            logging.info(f'Found {len(duplicates_list)} duplicates.')
+        logging.info(f'Found {len(duplicates_list)} duplicates.')
 
         return duplicates_list
 
+    def _match_window(self, hashes, img_list=None):
+        """
+        Find duplicate hashes by comparing each frame against a sliding window of recently kept frames.
+
+        Parameters:
+        hashes (list): A list of integers representing the dhash of each image.
+        img_list (list): The image paths matching the hashes, named by frame number.
+
+        Returns:
+        A list of tuples [(int, int)] representing the indices of the duplicate hashes in the input list.
+        """
+        # visit the frames in video order
+        if img_list is None:
+            order = range(len(hashes))
+        else:
+            order = sorted(range(len(hashes)),
+                           key=lambda idx: (_frame_number(img_list[idx], idx), idx))
+
+        duplicates_list = []
+        recent = deque(maxlen=self.window_size)
+        for idx in order:
+            # find the closest recently kept frame within the threshold
+            match = None
+            best = self.threshold
+            for kept_idx in recent:
+                distance = hamming_distance(hashes[idx], hashes[kept_idx])
+                if distance <= best:
+                    match, best = kept_idx, distance
+            if match is None:
+                recent.append(idx)
+            else:
+                duplicates_list.append((idx, match))
+        logging.info(f'Found {len(duplicates_list)} duplicates.')
+
+        return duplicates_list
+
+    def make_hashes(self, img_list, size=8):
+        """
+        Create dhashes for a list of image files in a single batch.
+
+        Parameters:
+        img_list (list): A list of strings representing the paths to the images.
+        size (int): An integer representing the width and height of the hash grid.
+
+        Returns:
+        A list of integers representing the dhash of each image, in the order of the input list.
+        """
+        if not len(img_list):
+            return []
+        if self.hash_cache is None:
+            return self._compute_hashes(img_list, size)
+
+        # only hash images that are new or changed since they were cached
+        hashes = self.hash_cache.get_many(img_list)
+        missing = [idx for idx, filehash in enumerate(hashes) if filehash is None]
+        if missing:
+            missing_list = [img_list[idx] for idx in missing]
+            new_hashes = self._compute_hashes(missing_list, size)
+            self.hash_cache.put_many(missing_list, new_hashes)
+            for idx, filehash in zip(missing, new_hashes):
+                hashes[idx] = filehash
+        logging.info(f'Hashed {len(missing)} of {len(img_list)} images, the rest from cache.')
+
+        return hashes
+
+    def hash_bytes(self, contents, size=8):
+        """
+        Hash encoded images held in memory, such as archive members, without writing them to disk.
+
+        Parameters:
+        contents (iterable): Bytes of each encoded image file, decoded one at a time.
+        size (int): An integer representing the width and height of the hash grid.
+
+        Returns:
+        A list of integers representing the hash of each image, equal to hashing the same files from disk.
+        """
+        grids = [self._load_grids(io.BytesIO(content), size) for content in contents]
+        if not grids:
+            return []
+        grays = [np.stack(grid) for grid in zip(*grids)]
+
+        return hash_batch(self.hash_algos, grays, size)
+
+    def _compute_hashes(self, img_list, size=8):
+        """
+        Decode and hash a list of image files.
+
+        Parameters:
+        img_list (list): A list of strings representing the paths to the images.
+        size (int): An integer representing the width and height of the hash grid.
+
+        Returns:
+        A list of integers representing the dhash of each image, in the order of the input list.
+        """
+        # decode and resize the images in parallel, then hash the whole batch at once
+        if self.executor is not None and self.executor.size == size:
+            grids = self.executor.load_grids(img_list)
+        else:
+            with HashExecutor(self, size) as executor:
+                grids = executor.load_grids(img_list)
+        grays = [np.stack(grid) for grid in zip(*grids)]
+
+        return hash_batch(self.hash_algos, grays, size)
+
     def _make_hash(self, filename):
         """
         Create a dhash for an image file.
@@ -93,7 +388,25 @@ class DuplicateRemover():
             img_hash = self._convert_dhash(image)
 
             return img_hash
-            
+
+    def _load_grids(self, filename, size=8):
+        """
+        Decode an image file once into the grayscale thumbnails of every hash algorithm.
+
+        Parameters:
+        filename (str): A string representing the path to an image file.
+        size (int): An integer representing the width and height of the hash grid.
+
+        Returns:
+        A tuple of numpy arrays containing the grayscale pixel values, one per hash algorithm.
+        """
+        grids = hash_grids(self.hash_algos, size)
+        with Image.open(filename) as image:
+            gray = self._decode_gray(image, max(grids), max(grids))
+
+            return tuple(np.asarray(gray.resize((grid, grid), self.resample), dtype=np.uint8)
+                         for grid in grids)
+
     def _convert_dhash(self, image, size=8):
         """
         Convert an image to a difference hash (dhash).
@@ -107,27 +420,11 @@ class DuplicateRemover():
         """
         # convert an image to a difference hash
         width = size + 1
-        grays = self._get_grays(image, width, width)
-
-        # iterate across every pixel
-        row_hash = 0
-        col_hash = 0
-        size_range = range(size)
-        for y in size_range:
-            for x in size_range:
-                offset = y * width + x
-
-                # calculate the difference between each row pixel
-                row_bit = grays[offset] < grays[offset + 1]
-                row_hash = row_hash << 1 | row_bit
-                
-                # calculate the difference between each col pixel
-                col_bit = grays[offset] < grays[offset + width]
-                col_hash = col_hash << 1 | col_bit
-
-        return row_hash << (size * size) | col_hash
-    
-    
+        grays = self._get_gray_array(image, width, width)
+        row_hashes, col_hashes = dhash_batch(grays[np.newaxis], size)
+
+        return dhash_to_int(row_hashes, col_hashes, size)[0]
+
     def _get_grays(self, image, width, height):
         """
         Convert an image to grayscale and resize it.
@@ -140,6 +437,41 @@ class DuplicateRemover():
         Returns:
         A list of integers representing the grayscale pixel values of the resized image.
         """
+        return self._get_gray_array(image, width, height).ravel().tolist()
+
+    def _get_gray_array(self, image, width, height):
+        """
+        Convert an image to grayscale and resize it into a numpy array.
+
+        Parameters:
+        image (PIL.Image): A PIL image object.
+        width (int): An integer representing the width of the resized image.
+        height (int): An integer representing the height of the resized image.
+
+        Returns:
+        A numpy array of shape (height, width) containing the grayscale pixel values of the resized image.
+        """
+        # resize the image
+        image = self._decode_gray(image, width, height).resize((width, height), self.resample)
+
+        return np.asarray(image, dtype=np.uint8)
+
+    def _decode_gray(self, image, width, height):
+        """
+        Decode an image into grayscale, at reduced resolution in fast hash mode.
+
+        Parameters:
+        image (PIL.Image): A PIL image object.
+        width (int): An integer representing the smallest width needed after decoding.
+        height (int): An integer representing the smallest height needed after decoding.
+
+        Returns:
+        A PIL image object in grayscale mode.
+        """
+        # let libjpeg scale the DCT down while decoding, keeping at least the target size
+        if self.fast_hash and image.format == 'JPEG':
+            image.draft('L', (max(image.width // 8, width), max(image.height // 8, height)))
+
         # convert the image to grayscale and resized
         if image.mode in ('RGBA', 'LA') and self.fill_color is not None:
             cleaned = Image.new(image.mode[:-1], image.size, self.fill_color)
@@ -147,9 +479,14 @@ class DuplicateRemover():
             image = cleaned
 
         # convert to grayscale format
-        image = image.convert('L')
+        return image.convert('L')
 
-        # resize the image
-        image = image.resize((width, height), self.resample)
 
-        return list(image.getdata())
\ No newline at end of file
+def _frame_number(filename, default):
+    """
+    Read the frame number from an image file name, falling back to a default for other names.
+    """
+    try:
+        return int(Path(filename).stem)
+    except ValueError:
+        return default
@@ -0,0 +1,55 @@
+import os
+import shutil
+import pandas as pd
+
+from pathlib import Path
+
+class FrameCache():
+    # parquet copies of the label rows and parsed srt data of each folder, one directory per folder
+    def __init__(self, path):
+        """
+        Initialize the FrameCache object.
+
+        Parameters:
+        path (str or pathlib.Path): The directory holding a directory of parquet files per folder.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def load(self, folder):
+        """
+        Load the cached frames of a folder.
+
+        Parameters:
+        folder (str): The folder name.
+
+        Returns:
+        (label_df, srt_dfs) (tuple): The label rows and the parsed dataframe of each srt file of the folder,
+            as passed to save, or None if the folder is not cached.
+        """
+        folder_path = self.path / folder
+        try:
+            label_df = pd.read_parquet(folder_path / 'labels.parquet')
+            srt_files = sorted(name for name in os.listdir(folder_path) if name.startswith('srt_'))
+        except FileNotFoundError:
+            return None
+
+        return label_df, [pd.read_parquet(folder_path / name) for name in srt_files]
+
+    def save(self, folder, label_df, srt_dfs):
+        """
+        Replace the cached frames of a folder.
+
+        Parameters:
+        folder (str): The folder name.
+        label_df (pandas.DataFrame): The label rows of the folder.
+        srt_dfs (list): The parsed dataframe of each srt file of the folder, in order.
+        """
+        folder_path = self.path / folder
+        shutil.rmtree(folder_path, ignore_errors=True)
+        folder_path.mkdir(parents=True)
+
+        # labels are written last, so a partly saved folder is never loaded
+        for number, srt_df in enumerate(srt_dfs):
+            srt_df.to_parquet(folder_path / f'srt_{number:05d}.parquet')
+        label_df.to_parquet(folder_path / 'labels.parquet')
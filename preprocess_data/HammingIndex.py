@@ -0,0 +1,95 @@
+class HammingIndex():
+    # multi-index hash over bit blocks for finding hashes within a hamming distance
+    def __init__(self, threshold, bits=128):
+        """
+        Initialize the HammingIndex object.
+
+        By the pigeonhole principle, two hashes within `threshold` bits of each other
+        must share at least one of `threshold + 1` disjoint bit blocks exactly, so only
+        hashes sharing a block are compared in full.
+
+        Parameters:
+        threshold (int): The maximum hamming distance for two hashes to match.
+        bits (int): The number of bits in each hash (default: 128).
+        """
+        if threshold < 0:
+            raise ValueError('threshold must be non-negative')
+        self.threshold = threshold
+        self.bits = bits
+
+        # split the hash into threshold + 1 contiguous blocks
+        n_blocks = min(threshold + 1, bits)
+        bounds = [round(i * bits / n_blocks) for i in range(n_blocks + 1)]
+        self.blocks = [(start, (1 << (end - start)) - 1)
+                       for start, end in zip(bounds[:-1], bounds[1:])]
+        self.tables = [dict() for _ in self.blocks]
+        self.values = []
+        self.keys = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value, key=None):
+        """
+        Add a hash to the index.
+
+        Parameters:
+        value (int): The hash to add.
+        key (object): The key returned when the hash is matched (default: insertion position).
+        """
+        position = len(self.values)
+        self.values.append(value)
+        self.keys.append(position if key is None else key)
+        for table, (shift, mask) in zip(self.tables, self.blocks):
+            table.setdefault(value >> shift & mask, []).append(position)
+
+    def query(self, value):
+        """
+        Find every indexed hash within the threshold of a hash.
+
+        Parameters:
+        value (int): The hash to look up.
+
+        Returns:
+        matches (list): A list of tuples (distance, key) sorted by distance then insertion order.
+        """
+        candidates = set()
+        for table, (shift, mask) in zip(self.tables, self.blocks):
+            candidates.update(table.get(value >> shift & mask, ()))
+
+        matches = []
+        for position in sorted(candidates):
+            distance = hamming_distance(value, self.values[position])
+            if distance <= self.threshold:
+                matches.append((distance, position))
+        matches.sort()
+
+        return [(distance, self.keys[position]) for distance, position in matches]
+
+    def nearest(self, value):
+        """
+        Find the closest indexed hash within the threshold of a hash.
+
+        Parameters:
+        value (int): The hash to look up.
+
+        Returns:
+        key (object): The key of the closest hash, or None if no hash is within the threshold.
+        """
+        matches = self.query(value)
+
+        return matches[0][1] if matches else None
+
+
+def hamming_distance(a, b):
+    """
+    Count the number of differing bits between two integer hashes.
+
+    Parameters:
+    a (int): The first hash.
+    b (int): The second hash.
+
+    Returns:
+    distance (int): The hamming distance between the hashes.
+    """
+    return bin(a ^ b).count('1')
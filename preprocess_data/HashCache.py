@@ -0,0 +1,90 @@
+import os
+import sqlite3
+
+class HashCache():
+    # per-image hash cache in sqlite keyed by path, file size and modification time
+    def __init__(self, path, algorithm='dhash', batch_size=500):
+        """
+        Initialize the HashCache object, creating the database if needed.
+
+        Parameters:
+        path (str or pathlib.Path): The sqlite database file.
+        algorithm (str): The name of the hash stored, so different hashes of an image can be cached (default: 'dhash').
+        batch_size (int): The number of paths looked up per query (default: 500).
+        """
+        self.path = path
+        self.algorithm = algorithm
+        self.batch_size = batch_size
+        # the connection may be handed to a single worker thread, such as a pipeline stage
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                path TEXT NOT NULL,
+                algorithm TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash BLOB NOT NULL,
+                PRIMARY KEY (path, algorithm)
+            )""")
+        self.connection.commit()
+
+    def get_many(self, paths):
+        """
+        Look up the cached hashes of a list of image files.
+
+        Parameters:
+        paths (list): A list of paths to image files.
+
+        Returns:
+        hashes (list): The cached integer hash of each file, or None if it is missing or the file has changed.
+        """
+        keys = [_file_key(path) for path in paths]
+        cached = {}
+        for start in range(0, len(keys), self.batch_size):
+            names = [key[0] for key in keys[start:start + self.batch_size]]
+            rows = self.connection.execute(
+                f'SELECT path, size, mtime_ns, hash FROM hashes '
+                f'WHERE algorithm = ? AND path IN ({",".join("?" * len(names))})',
+                [self.algorithm, *names])
+            for name, size, mtime_ns, value in rows:
+                cached[name] = (size, mtime_ns, int.from_bytes(value, 'big'))
+
+        hashes = []
+        for name, size, mtime_ns in keys:
+            entry = cached.get(name)
+            if entry is not None and entry[:2] == (size, mtime_ns):
+                hashes.append(entry[2])
+            else:
+                hashes.append(None)
+
+        return hashes
+
+    def put_many(self, paths, hashes):
+        """
+        Store the hashes of a list of image files.
+
+        Parameters:
+        paths (list): A list of paths to image files.
+        hashes (list): The integer hash of each file.
+        """
+        rows = [(*_file_key(path), self.algorithm, value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+                for path, value in zip(paths, hashes)]
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO hashes (path, size, mtime_ns, algorithm, hash) VALUES (?, ?, ?, ?, ?)',
+            rows)
+        self.connection.commit()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        self.connection.close()
+
+
+def _file_key(path):
+    """
+    Create the cache key of a file from its absolute path, size and modification time.
+    """
+    stat = os.stat(path)
+
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,95 @@
+import os
+import logging
+
+from multiprocessing.pool import Pool
+
+# hashing settings of each worker process, set once by the pool initializer
+_worker_remover = None
+_worker_size = None
+
+class HashExecutor():
+    # long-lived process pool decoding images into grayscale thumbnails for hashing
+    def __init__(self, remover, size=8, processes=None, chunksize=None, min_pool_items=64):
+        """
+        Initialize the HashExecutor object. The pool is started on first use or by start, and reused until closed.
+
+        Parameters:
+        remover (DuplicateRemover): The DuplicateRemover whose decode settings the workers use.
+        size (int): An integer representing the width and height of the hash grid (default: 8).
+        processes (int): The number of worker processes (default: None for the number of CPUs).
+        chunksize (int): The number of paths sent to a worker at a time (default: None to tune per folder).
+        min_pool_items (int): Folders with fewer images are decoded in this process without the pool (default: 64).
+        """
+        self.remover = remover
+        self.size = size
+        self.processes = processes or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.min_pool_items = min_pool_items
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load_grids(self, img_list):
+        """
+        Decode a list of image files into the grayscale thumbnails of every hash algorithm.
+
+        Parameters:
+        img_list (list): A list of strings representing the paths to the images.
+
+        Returns:
+        A list of tuples of numpy arrays, one tuple per image in the order of the input list.
+        """
+        # small folders are not worth the inter-process overhead
+        if len(img_list) < self.min_pool_items or self.processes == 1:
+            return [self.remover._load_grids(path, self.size) for path in img_list]
+
+        self.start()
+        chunksize = self.chunksize or max(1, min(64, len(img_list) // (self.processes * 4)))
+        grids = [None] * len(img_list)
+        for idx, grid in self.pool.imap_unordered(_load_indexed, enumerate(img_list), chunksize):
+            grids[idx] = grid
+
+        return grids
+
+    def start(self):
+        """
+        Start the worker processes if they are not running.
+
+        Workers are forked from the calling process, so start the pool before starting other threads,
+        whose locks a forked worker could otherwise inherit while held.
+        """
+        if self.pool is None and self.processes > 1:
+            logging.info(f'Starting hashing pool with {self.processes} processes')
+            self.pool = Pool(self.processes, initializer=_init_worker,
+                             initargs=(self.remover, self.size))
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+def _init_worker(remover, size):
+    """
+    Store the hashing settings in a worker process.
+    """
+    global _worker_remover, _worker_size
+    _worker_remover = remover
+    _worker_size = size
+
+
+def _load_indexed(item):
+    """
+    Decode one indexed image path in a worker process.
+    """
+    idx, path = item
+
+    return idx, _worker_remover._load_grids(path, _worker_size)
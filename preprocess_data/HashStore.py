@@ -0,0 +1,269 @@
+import json
+import logging
+import numpy as np
+
+from pathlib import Path
+
+# number of set bits in every byte value
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+class HashStore():
+    # global on-disk store of 128 bit image hashes held in memory-mapped numpy arrays
+    arrays = {'hash_hi': np.uint64, 'hash_lo': np.uint64,
+              'folder_id': np.uint32, 'frame_id': np.int64}
+    bits = 128
+    block_bits = 16
+    max_threshold = bits // block_bits - 1
+
+    def __init__(self, path, algorithm='dhash', capacity=1024, chunk_size=1 << 20, max_pairs=1 << 22):
+        """
+        Initialize the HashStore object, opening an existing store if present.
+
+        Parameters:
+        path (str or pathlib.Path): The directory holding the store files.
+        algorithm (str): The name of the hash stored, as HashCache names it. An existing store holding hashes
+            of another algorithm is refused, as their distances mean nothing (default: 'dhash').
+        capacity (int): The initial number of rows allocated for a new store (default: 1024).
+        chunk_size (int): The number of stored rows scanned at a time when querying (default: 1048576).
+        max_pairs (int): The number of candidate pairs compared at a time when querying (default: 4194304).
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.max_pairs = max_pairs
+
+        # load the folder names and number of rows used
+        meta_path = self.path / 'meta.json'
+        if meta_path.exists():
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        else:
+            meta = {'count': 0, 'folders': []}
+        if meta['count'] and meta.get('algorithm') != algorithm:
+            raise ValueError(f'The hash store at {self.path} holds {meta.get("algorithm", "unrecorded")} hashes, '
+                             f'not {algorithm}')
+        self.algorithm = algorithm
+        self.count = meta['count']
+        self.folders = meta['folders']
+        self.folder_ids = {name: i for i, name in enumerate(self.folders)}
+
+        # open or create the memory-mapped columns
+        self.columns = {}
+        for name, dtype in self.arrays.items():
+            file_name = self.path / f'{name}.npy'
+            if file_name.exists():
+                self.columns[name] = np.lib.format.open_memmap(file_name, mode='r+')
+            else:
+                self.columns[name] = np.lib.format.open_memmap(
+                    file_name, mode='w+', dtype=dtype, shape=(max(capacity, 1),))
+
+    def __len__(self):
+        return self.count
+
+    def has_folder(self, folder):
+        """
+        Check whether a folder has already been added to the store.
+
+        Parameters:
+        folder (str): The folder name.
+
+        Returns:
+        (bool): True if the folder has hashes in the store.
+        """
+        return folder in self.folder_ids
+
+    def add(self, folder, frames, hashes):
+        """
+        Append the hashes of a folder's frames to the store.
+
+        Parameters:
+        folder (str): The folder name.
+        frames (list): A list of integers representing the frame number of each hash.
+        hashes (list): A list of 128 bit integer hashes.
+        """
+        if folder not in self.folder_ids:
+            self.folder_ids[folder] = len(self.folders)
+            self.folders.append(folder)
+        if not len(hashes):
+            self.flush()
+            return
+
+        hash_hi, hash_lo = split_hashes(hashes)
+        start, end = self.count, self.count + len(hashes)
+        self._reserve(end)
+        self.columns['hash_hi'][start:end] = hash_hi
+        self.columns['hash_lo'][start:end] = hash_lo
+        self.columns['folder_id'][start:end] = self.folder_ids[folder]
+        self.columns['frame_id'][start:end] = frames
+        self.count = end
+        self.flush()
+
+    def query(self, hashes, threshold=0, exclude_folder=None):
+        """
+        Find stored hashes within a hamming distance of each query hash.
+
+        Every stored row is split into 16 bit blocks, and only rows sharing a block
+        with a query hash are compared in full. Above a threshold of 7 two close hashes
+        may share no block, so every stored row is compared in full instead.
+
+        Parameters:
+        hashes (list): A list of 128 bit integer hashes to look up.
+        threshold (int): The maximum hamming distance for a match (default: 0).
+        exclude_folder (str): A folder name whose stored hashes are ignored (default: None).
+
+        Returns:
+        matches (list): A list of tuples (query_index, folder, frame, distance) sorted by query index then distance.
+        """
+        if threshold < 0:
+            raise ValueError('threshold must be non-negative')
+        if not len(hashes) or not self.count:
+            return []
+
+        exclude_id = self.folder_ids.get(exclude_folder, len(self.folders))
+        query_hi, query_lo = split_hashes(hashes)
+        if threshold > self.max_threshold:
+            pairs = self._scan_pairs(len(hashes))
+        else:
+            pairs = self._block_pairs(query_hi, query_lo)
+
+        found_q, found_row, found_dist = [], [], []
+        for pair_q, pair_row in pairs:
+            # verify the full distance of each candidate pair
+            distance = (popcount(query_hi[pair_q] ^ self.columns['hash_hi'][pair_row]) +
+                        popcount(query_lo[pair_q] ^ self.columns['hash_lo'][pair_row]))
+            keep = (distance <= threshold) & (self.columns['folder_id'][pair_row] != exclude_id)
+            found_q.append(pair_q[keep])
+            found_row.append(pair_row[keep])
+            found_dist.append(distance[keep])
+
+        if not sum(len(q) for q in found_q):
+            return []
+
+        # remove pairs found through more than one block
+        found_q = np.concatenate(found_q)
+        found_row = np.concatenate(found_row)
+        found_dist = np.concatenate(found_dist)
+        _, unique = np.unique(np.stack([found_q, found_row]), axis=1, return_index=True)
+        order = np.lexsort((found_row[unique], found_dist[unique], found_q[unique]))
+        unique = unique[order]
+
+        folder_ids = self.columns['folder_id'][found_row[unique]].tolist()
+        frame_ids = self.columns['frame_id'][found_row[unique]].tolist()
+        return [(q, self.folders[folder_id], frame, dist)
+                for q, folder_id, frame, dist in zip(found_q[unique].tolist(), folder_ids,
+                                                     frame_ids, found_dist[unique].tolist())]
+
+    def _block_pairs(self, query_hi, query_lo):
+        """
+        Yield (query, row) index arrays of the candidate pairs sharing a 16 bit block,
+        at most max_pairs at a time so blocks shared by many frames stay bounded in memory.
+        """
+        mask = np.uint64((1 << self.block_bits) - 1)
+        for block in range(128 // self.block_bits):
+            word = 'hash_hi' if block < 64 // self.block_bits else 'hash_lo'
+            shift = np.uint64(block * self.block_bits % 64)
+            query_block = ((query_hi if word == 'hash_hi' else query_lo) >> shift) & mask
+
+            # group the queries by block value
+            order = np.argsort(query_block, kind='stable')
+            values, starts, counts = np.unique(query_block[order], return_index=True, return_counts=True)
+
+            for start in range(0, self.count, self.chunk_size):
+                end = min(start + self.chunk_size, self.count)
+                stored_block = (self.columns[word][start:end] >> shift) & mask
+
+                # find stored rows sharing the block with any query
+                pos = np.minimum(np.searchsorted(values, stored_block), len(values) - 1)
+                rows = np.nonzero(values[pos] == stored_block)[0]
+
+                # expand hit rows into pairs with every query in their group, a batch of rows at a time
+                totals = np.cumsum(counts[pos[rows]])
+                first = 0
+                while first < len(rows):
+                    done = totals[first - 1] if first else 0
+                    last = max(int(np.searchsorted(totals, done + self.max_pairs, side='right')), first + 1)
+                    group = pos[rows[first:last]]
+                    pair_counts = counts[group]
+                    offsets = (np.arange(pair_counts.sum()) -
+                               np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts))
+                    yield (order[np.repeat(starts[group], pair_counts) + offsets],
+                           np.repeat(rows[first:last], pair_counts) + start)
+                    first = last
+
+    def _scan_pairs(self, n_queries):
+        """
+        Yield (query, row) index arrays pairing every query with every stored row,
+        at most max_pairs at a time.
+        """
+        rows_per_batch = max(self.max_pairs // n_queries, 1)
+        queries = np.arange(n_queries)
+        for start in range(0, self.count, rows_per_batch):
+            end = min(start + rows_per_batch, self.count)
+            for q_start in range(0, n_queries, self.max_pairs):
+                pair_q = queries[q_start:q_start + self.max_pairs]
+                yield (np.tile(pair_q, end - start),
+                       np.repeat(np.arange(start, end), len(pair_q)))
+
+    def flush(self):
+        """
+        Write the memory-mapped columns and metadata to disk.
+        """
+        for column in self.columns.values():
+            column.flush()
+        with open(self.path / 'meta.json', 'w') as f:
+            json.dump({'count': self.count, 'folders': self.folders, 'algorithm': self.algorithm}, f)
+
+    def _reserve(self, size):
+        """
+        Grow the memory-mapped columns to hold at least `size` rows.
+        """
+        capacity = len(self.columns['hash_hi'])
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        logging.info(f'Growing hash store at {self.path} to {capacity} rows')
+
+        for name, dtype in self.arrays.items():
+            file_name = self.path / f'{name}.npy'
+            tmp_name = self.path / f'{name}.tmp.npy'
+            grown = np.lib.format.open_memmap(tmp_name, mode='w+', dtype=dtype, shape=(capacity,))
+            grown[:self.count] = self.columns[name][:self.count]
+            grown.flush()
+            del grown
+            self.columns[name] = None
+            tmp_name.replace(file_name)
+            self.columns[name] = np.lib.format.open_memmap(file_name, mode='r+')
+
+
+def split_hashes(hashes):
+    """
+    Split 128 bit integer hashes into their high and low 64 bit halves.
+
+    Parameters:
+    hashes (list): A list of 128 bit integer hashes.
+
+    Returns:
+    (hash_hi, hash_lo) (tuple): Two uint64 arrays holding the upper and lower halves.
+    """
+    if any(h >> 128 for h in hashes):
+        raise ValueError('HashStore only holds 128 bit hashes')
+    mask = (1 << 64) - 1
+    hash_hi = np.array([h >> 64 for h in hashes], dtype=np.uint64)
+    hash_lo = np.array([h & mask for h in hashes], dtype=np.uint64)
+
+    return hash_hi, hash_lo
+
+
+def popcount(values):
+    """
+    Count the set bits of each value in a uint64 array.
+
+    Parameters:
+    values (numpy.ndarray): A uint64 array.
+
+    Returns:
+    counts (numpy.ndarray): An integer array of set bit counts.
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
@@ -0,0 +1,114 @@
+import os
+import time
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+class LabelReader():
+    # discovers and reads small label files with overlapping i/o across a thread pool
+    def __init__(self, threads=16, suffix='.txt'):
+        """
+        Initialize the LabelReader object.
+
+        Parameters:
+        threads (int): The number of threads scanning folders and reading files (default: 16).
+        suffix (str): The suffix of the label files (default: '.txt').
+        """
+        self.threads = threads
+        self.suffix = suffix
+        self.report = {}
+
+    def scan(self, data_path):
+        """
+        List the label files in every folder under a data path, at any depth below the top level.
+
+        Parameters:
+        data_path (pathlib.Path): The directory containing one folder per video.
+
+        Returns:
+        files_list (list): The label file paths, sorted by folder then path.
+        """
+        folders = sorted(entry.path for entry in os.scandir(data_path) if entry.is_dir())
+        with ThreadPoolExecutor(self.threads) as executor:
+            folder_files = executor.map(self._scan_folder, folders)
+
+            return [Path(path) for files in folder_files for path in files]
+
+    def read(self, files_list):
+        """
+        Read the text of every label file, in the order given.
+
+        Parameters:
+        files_list (list): The label file paths.
+
+        Returns:
+        texts (list): The text content of each file.
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.threads) as executor:
+            contents = list(executor.map(_read_bytes, files_list))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+
+        # report the read throughput
+        n_bytes = sum(len(content) for content in contents)
+        self.report = {'files': len(contents),
+                       'bytes': n_bytes,
+                       'seconds': elapsed,
+                       'files_per_second': len(contents) / elapsed,
+                       'mb_per_second': n_bytes / elapsed / 1e6}
+        logging.info(f'Read {len(contents)} label files ({n_bytes / 1e6:.1f} MB) in {elapsed:.2f}s: '
+                     f'{self.report["files_per_second"]:.0f} files/s, {self.report["mb_per_second"]:.2f} MB/s')
+
+        return [content.decode() for content in contents]
+
+    def read_all(self, data_path):
+        """
+        Scan a data path and read every label file in it.
+
+        Parameters:
+        data_path (pathlib.Path): The directory containing one folder per video.
+
+        Returns:
+        (files_list, texts) (tuple): The label file paths and the text content of each file.
+        """
+        files_list = self.scan(data_path)
+
+        return files_list, self.read(files_list)
+
+    def read_folder(self, folder):
+        """
+        Scan a single folder and read every label file in it, as read_all does for each folder.
+
+        Parameters:
+        folder (pathlib.Path): The folder of a video, which may not exist.
+
+        Returns:
+        (files_list, texts) (tuple): The label file paths and the text content of each file.
+        """
+        files_list = [Path(path) for path in self._scan_folder(folder)] if os.path.isdir(folder) else []
+
+        return files_list, self.read(files_list)
+
+    def _scan_folder(self, folder):
+        """
+        List the label files in a folder and its subfolders, sorted by path.
+        """
+        files, folders = [], [folder]
+        while folders:
+            with os.scandir(folders.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    elif entry.name.endswith(self.suffix) and entry.is_file():
+                        files.append(entry.path)
+
+        return sorted(files)
+
+
+def _read_bytes(path):
+    """
+    Read the raw content of a file.
+    """
+    with open(path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import logging
+import platform
+import threading
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # resource usage is only available on unix
+    resource = None
+
+class Metrics():
+    # records wall time, cpu time, peak memory, items and i/o bytes per stage, and wall and thread time per folder
+    def __init__(self, enabled=True):
+        """
+        Initialize the Metrics object.
+
+        Parameters:
+        enabled (bool): Record measurements, or only hand out empty records so instrumented code
+            costs next to nothing (default: True).
+        """
+        self.enabled = enabled
+        self.records = []
+        self.lock = threading.Lock()
+        self.start = time.time()
+
+    @contextmanager
+    def stage(self, name, folder=None):
+        """
+        Measure a block of code as a stage, or as a stage of a single folder.
+
+        Stages of different folders can run at the same time in different threads, so a folder record
+        only holds its wall time and the cpu time of its own thread ('scope': 'thread'). A stage as a whole
+        also records the process wide cpu time, peak memory and i/o bytes ('scope': 'process').
+
+        Parameters:
+        name (str): The stage name.
+        folder (str): The folder name, or None for the stage as a whole.
+
+        Yields:
+        record (dict): The record of the stage, where the block can set 'items' or other values.
+        """
+        record = {'stage': name, 'folder': folder, 'items': None}
+        if not self.enabled:
+            yield record
+            return
+
+        if folder is not None:
+            record['scope'] = 'thread'
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                yield record
+            finally:
+                record['wall_seconds'] = time.perf_counter() - start
+                record['thread_cpu_seconds'] = time.thread_time() - cpu_start
+                self.add(record)
+            return
+
+        record['scope'] = 'process'
+        before = _sample()
+        try:
+            yield record
+        finally:
+            after = _sample()
+            record.update({key: after[key] - before[key] for key in
+                           ('wall_seconds', 'cpu_seconds', 'children_cpu_seconds')})
+            record['peak_rss_mb'] = after['peak_rss_mb']
+            record['children_peak_rss_mb'] = after['children_peak_rss_mb']
+            for key in ('read_bytes', 'write_bytes', 'rchar', 'wchar'):
+                if key in before and key in after:
+                    record[key] = after[key] - before[key]
+            self.add(record)
+
+    def add(self, record):
+        """
+        Add a record measured elsewhere, such as an archive extraction report.
+
+        Parameters:
+        record (dict): The values of the record, with at least a 'stage' name.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.records.append(record)
+
+    def report(self):
+        """
+        Summarise the records into a json serialisable report.
+
+        Returns:
+        report (dict): The 'host', run 'started' time, 'stages' records and per folder records under 'folders'.
+        """
+        with self.lock:
+            records = list(self.records)
+
+        return {'host': {'node': platform.node(), 'cpus': os.cpu_count(), 'python': platform.python_version()},
+                'started': self.start,
+                'stages': [record for record in records if record.get('folder') is None],
+                'folders': [record for record in records if record.get('folder') is not None]}
+
+    def write(self, path):
+        """
+        Write the report as json, doing nothing when disabled.
+
+        Parameters:
+        path (str or pathlib.Path): The json file.
+        """
+        if not self.enabled:
+            return
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=4, default=str)
+        logging.info(f'Wrote {len(self.records)} metrics records to {path}')
+
+
+def _sample():
+    """
+    Sample the process wide counters.
+    """
+    sample = {'wall_seconds': time.perf_counter(),
+              'cpu_seconds': time.process_time(),
+              'children_cpu_seconds': 0.0,
+              'peak_rss_mb': None,
+              'children_peak_rss_mb': None}
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        sample['children_cpu_seconds'] = children.ru_utime + children.ru_stime
+        # ru_maxrss is in kilobytes on linux and bytes on macos
+        scale = 1 / 1024 ** 2 if platform.system() == 'Darwin' else 1 / 1024
+        sample['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        sample['children_peak_rss_mb'] = children.ru_maxrss * scale
+
+    # storage and syscall byte counts where the kernel reports them
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                key, value = line.split(':')
+                sample[key] = int(value)
+    except OSError:
+        pass
+
+    return sample
@@ -0,0 +1,207 @@
+import numpy as np
+
+# registered hash algorithms, name -> (hash function, grid size function)
+HASH_REGISTRY = {}
+
+
+def register_hash(name, grid):
+    """
+    Register a vectorized perceptual hash function.
+
+    The function takes a uint8 array of shape (N, grid(size), grid(size)) and the hash size,
+    and returns a boolean array of shape (N, bits) with the most significant bit first.
+
+    Parameters:
+    name (str): The name used to select the algorithm.
+    grid (function): Maps the hash size to the width and height of the grayscale thumbnail needed.
+    """
+    def decorator(func):
+        HASH_REGISTRY[name] = (func, grid)
+        return func
+
+    return decorator
+
+
+def hash_grids(algorithms, size=8):
+    """
+    List the thumbnail sizes needed by a list of hash algorithms.
+
+    Parameters:
+    algorithms (list): A list of registered algorithm names.
+    size (int): An integer representing the width and height of the hash grid (default: 8).
+
+    Returns:
+    grids (list): The width and height of the thumbnail of each algorithm.
+    """
+    for name in algorithms:
+        if name not in HASH_REGISTRY:
+            raise ValueError(f'Unknown hash algorithm: {name}')
+
+    return [HASH_REGISTRY[name][1](size) for name in algorithms]
+
+
+def hash_batch(algorithms, grays, size=8):
+    """
+    Hash a batch of thumbnails with each algorithm and concatenate the results.
+
+    Parameters:
+    algorithms (list): A list of registered algorithm names.
+    grays (list): One uint8 array of shape (N, grid, grid) per algorithm, as sized by hash_grids.
+    size (int): An integer representing the width and height of the hash grid (default: 8).
+
+    Returns:
+    A list of integers holding the hash bits of every algorithm, the first algorithm most significant.
+    """
+    bits = [HASH_REGISTRY[name][0](grid, size) for name, grid in zip(algorithms, grays)]
+
+    return bits_to_int(np.concatenate(bits, axis=1))
+
+
+def hash_bits(algorithms, size=8):
+    """
+    Count the bits of the hash concatenated from a list of hash algorithms.
+
+    Parameters:
+    algorithms (list): A list of registered algorithm names.
+    size (int): An integer representing the width and height of the hash grid (default: 8).
+
+    Returns:
+    bits (int): The total number of hash bits.
+    """
+    grids = hash_grids(algorithms, size)
+
+    return sum(HASH_REGISTRY[name][0](np.zeros((1, grid, grid), dtype=np.uint8), size).shape[1]
+               for name, grid in zip(algorithms, grids))
+
+
+@register_hash('dhash', lambda size: size + 1)
+def dhash_bits(grays, size=8):
+    """
+    Difference hash, whether each pixel is darker than its right neighbour then its lower neighbour.
+    """
+    pixels = grays[:, :size, :size]
+    row_bits = pixels < grays[:, :size, 1:]
+    col_bits = pixels < grays[:, 1:, :size]
+
+    count = len(grays)
+    return np.concatenate([row_bits.reshape(count, -1), col_bits.reshape(count, -1)], axis=1)
+
+
+@register_hash('ahash', lambda size: size)
+def ahash_bits(grays, size=8):
+    """
+    Average hash, whether each pixel is brighter than the mean of the thumbnail.
+    """
+    pixels = grays.reshape(len(grays), -1).astype(np.float32)
+
+    return pixels > pixels.mean(axis=1, keepdims=True)
+
+
+@register_hash('phash', lambda size: size * 4)
+def phash_bits(grays, size=8):
+    """
+    Perceptual hash, whether each low frequency DCT coefficient is above their median.
+    """
+    dct = _dct_matrix(grays.shape[-1])
+    coeffs = dct @ grays.astype(np.float64) @ dct.T
+    low = coeffs[:, :size, :size].reshape(len(grays), -1)
+
+    return low > np.median(low, axis=1, keepdims=True)
+
+
+@register_hash('whash', lambda size: size * 8)
+def whash_bits(grays, size=8):
+    """
+    Wavelet hash, whether each Haar low-low band coefficient is above their median.
+    """
+    # the haar low-low band at level 3 is proportional to the mean of each 8x8 block
+    count, height, width = grays.shape
+    blocks = grays.reshape(count, size, height // size, size, width // size).astype(np.float32)
+    low = blocks.mean(axis=(2, 4)).reshape(count, -1)
+
+    return low > np.median(low, axis=1, keepdims=True)
+
+
+def dhash_batch(grays, size=8):
+    """
+    Compute the row and column difference hashes for a batch of grayscale thumbnails.
+
+    Parameters:
+    grays (numpy.ndarray): An array of shape (N, size + 1, size + 1) containing grayscale pixel values.
+    size (int): An integer representing the width and height of the hash grid.
+
+    Returns:
+    (row_hashes, col_hashes) (tuple): Two uint64 arrays of shape (N, words) holding the packed hash bits,
+    most significant word first.
+    """
+    width = size + 1
+    grays = np.asarray(grays).reshape(-1, width, width)
+    bits = dhash_bits(grays, size)
+
+    return _pack_bits(bits[:, :size * size]), _pack_bits(bits[:, size * size:])
+
+
+def dhash_to_int(row_hashes, col_hashes, size=8):
+    """
+    Combine packed row and column hashes into the integer dhash used by DuplicateRemover.
+
+    Parameters:
+    row_hashes (numpy.ndarray): A uint64 array of shape (N, words) returned by dhash_batch.
+    col_hashes (numpy.ndarray): A uint64 array of shape (N, words) returned by dhash_batch.
+    size (int): An integer representing the width and height of the hash grid.
+
+    Returns:
+    A list of integers representing the dhash of each image.
+    """
+    bits = size * size
+    return [_words_to_int(row) << bits | _words_to_int(col)
+            for row, col in zip(row_hashes.tolist(), col_hashes.tolist())]
+
+
+def bits_to_int(bits):
+    """
+    Convert rows of boolean bits, most significant first, into integers.
+
+    Parameters:
+    bits (numpy.ndarray): A boolean array of shape (N, bits).
+
+    Returns:
+    A list of integers, one per row.
+    """
+    return [_words_to_int(words) for words in _pack_bits(bits).tolist()]
+
+
+def _dct_matrix(n):
+    """
+    Create the orthonormal DCT-II matrix of size n.
+    """
+    k = np.arange(n)[:, np.newaxis]
+    matrix = np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+
+    return matrix
+
+
+def _pack_bits(bits):
+    """
+    Pack rows of boolean bits into big-endian uint64 words, left padding with zeros.
+    """
+    count, nbits = bits.shape
+    words = -(-nbits // 64)
+    pad = words * 64 - nbits
+    if pad:
+        bits = np.concatenate([np.zeros((count, pad), dtype=bool), bits], axis=1)
+    packed = np.packbits(bits, axis=1)
+
+    return packed.view('>u8').astype(np.uint64)
+
+
+def _words_to_int(words):
+    """
+    Join a list of 64 bit words, most significant first, into a single integer.
+    """
+    value = 0
+    for word in words:
+        value = value << 64 | word
+
+    return value
@@ -0,0 +1,88 @@
+import time
+import queue
+import logging
+import threading
+
+class Pipeline():
+    # runs items through a chain of stages, each stage with its own threads and a bounded input queue
+    def __init__(self, stages, queue_size=2):
+        """
+        Initialize the Pipeline object.
+
+        Parameters:
+        stages (list): (name, function, threads) for each stage in order. Each function takes the
+            output of the previous stage, or the item itself for the first stage.
+        queue_size (int): The number of items waiting in front of each stage, so a fast stage blocks
+            instead of running ahead of a slow one (default: 2).
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.report = {}
+
+    def run(self, items):
+        """
+        Run every item through all stages, overlapping different items in different stages.
+
+        Parameters:
+        items (list): The items fed to the first stage.
+
+        Returns:
+        results (list): The output of the last stage for each item, in the order given.
+        """
+        items = list(items)
+        queues = [queue.Queue(self.queue_size) for _ in self.stages]
+        results = [None] * len(items)
+        errors = []
+        lock = threading.Lock()
+        self.report = {name: {'items': 0, 'seconds': 0.0} for name, _, _ in self.stages}
+
+        def work(stage):
+            name, function, _ = self.stages[stage]
+            while True:
+                task = queues[stage].get()
+                if task is None:
+                    return
+                index, value = task
+                if errors:
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    value = function(value)
+                except Exception as error:
+                    with lock:
+                        errors.append(error)
+                    logging.exception(f'Pipeline stage {name} failed on item {index}')
+                    continue
+                with lock:
+                    self.report[name]['items'] += 1
+                    self.report[name]['seconds'] += time.perf_counter() - start
+
+                if stage + 1 < len(self.stages):
+                    queues[stage + 1].put((index, value))
+                else:
+                    results[index] = value
+
+        # start every stage, then feed the first queue
+        workers = []
+        for stage, (_, _, threads) in enumerate(self.stages):
+            workers.append([threading.Thread(target=work, args=(stage,), daemon=True)
+                            for _ in range(max(1, threads))])
+            for thread in workers[-1]:
+                thread.start()
+        for index, item in enumerate(items):
+            queues[0].put((index, item))
+
+        # stop each stage once the stage before it has finished
+        for stage, threads in enumerate(workers):
+            for _ in threads:
+                queues[stage].put(None)
+            for thread in threads:
+                thread.join()
+
+        for name, report in self.report.items():
+            logging.info(f'Pipeline stage {name}: {report["items"]} items in {report["seconds"]:.2f}s busy')
+        if errors:
+            raise errors[0]
+
+        return results
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from pathlib import Path
+
+class RunManifest():
+    # json record of the stages completed for each folder and the input fingerprints they ran with
+    def __init__(self, path, stages=('extract', 'dedup', 'frames'), save_interval=30):
+        """
+        Initialize the RunManifest object, loading the manifest of a previous run if there is one.
+
+        Parameters:
+        path (str or pathlib.Path): The json manifest file.
+        stages (tuple): The folder stages in run order. Completing a stage again drops the records of
+            the stages after it, so they run again on the new output (default: ('extract', 'dedup', 'frames')).
+        save_interval (float): The least number of seconds between saves while stages complete, so a run over
+            many folders does not rewrite the whole manifest after each one. Call save once the run ends
+            (default: 30).
+        """
+        self.path = Path(path)
+        self.stages = tuple(stages)
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.folders = {}
+        self.run = {}
+        self.saved = time.monotonic()
+        if self.path.exists():
+            with open(self.path) as f:
+                manifest = json.load(f)
+            self.folders = manifest.get('folders', {})
+            self.run = manifest.get('run', {})
+
+    def done(self, folder, stage, fingerprint):
+        """
+        Whether a stage completed for a folder with the same input fingerprint.
+
+        Parameters:
+        folder (str): The folder name, or None for a stage of the whole run.
+        stage (str): The stage name.
+        fingerprint (dict): The json serialisable fingerprint of the stage inputs.
+
+        Returns:
+        bool: True if the stage can be skipped.
+        """
+        record = self.record(folder, stage)
+
+        return record is not None and record['fingerprint'] == _normalise(fingerprint)
+
+    def record(self, folder, stage):
+        """
+        The record of a completed stage, holding its 'fingerprint', 'result' and 'completed' time, or None.
+        """
+        with self.lock:
+            records = self.run if folder is None else self.folders.get(folder, {})
+
+            return records.get(stage)
+
+    def complete(self, folder, stage, fingerprint, result=None):
+        """
+        Record a completed stage, saving the manifest if the last save is older than the save interval.
+
+        Parameters:
+        folder (str): The folder name, or None for a stage of the whole run.
+        stage (str): The stage name.
+        fingerprint (dict): The json serialisable fingerprint of the stage inputs.
+        result: A json serialisable result restored when the stage is skipped (default: None).
+        """
+        with self.lock:
+            if folder is None:
+                records = self.run
+            else:
+                records = self.folders.setdefault(folder, {})
+                if stage in self.stages:
+                    for later in self.stages[self.stages.index(stage) + 1:]:
+                        records.pop(later, None)
+            records[stage] = {'fingerprint': _normalise(fingerprint),
+                              'result': _normalise(result),
+                              'completed': time.time()}
+            if time.monotonic() - self.saved >= self.save_interval:
+                self._save()
+
+    def save(self):
+        """
+        Save every completed stage.
+        """
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        """
+        Write the manifest as compact json atomically, so a crash never leaves a partial file.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'folders': self.folders, 'run': self.run}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.saved = time.monotonic()
+
+
+def file_fingerprint(path):
+    """
+    Fingerprint a file by its size and modification time, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def folder_digest(folder, suffix='.txt'):
+    """
+    Digest the paths, sizes and modification times of the files with a suffix in a folder and its subfolders.
+    """
+    files, folders = [], [folder]
+    try:
+        while folders:
+            current = folders.pop()
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    elif entry.name.endswith(suffix) and entry.is_file():
+                        files.append((os.path.relpath(entry.path, folder), entry.stat()))
+    except FileNotFoundError:
+        return None
+
+    digest = hashlib.sha1()
+    for name, stat in sorted(files):
+        digest.update(f'{name}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+
+    return digest.hexdigest()
+
+
+def json_digest(value):
+    """
+    Digest a json serialisable value, so a large fingerprint can be stored in a few bytes.
+    """
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def _normalise(value):
+    """
+    Round trip a value through json, so tuples compare equal to the lists loaded back.
+    """
+    return json.loads(json.dumps(value))
@@ -0,0 +1,109 @@
+import os
+import time
+import hashlib
+import logging
+import pandas as pd
+
+from pathlib import Path
+
+from .SrtReader import PARSER_VERSION
+
+class SrtCache():
+    # on-disk cache of parsed srt dataframes, one parquet file per srt fingerprint
+    modes = ('use', 'bypass', 'rebuild')
+
+    def __init__(self, path, max_bytes=None, max_age=None, mode='use'):
+        """
+        Initialize the SrtCache object.
+
+        Parameters:
+        path (str or pathlib.Path) : The directory holding the cached parquet files.
+        max_bytes (int) : Evict the least recently used files above this total size (default: None for no limit).
+        max_age (float) : Evict files not used for this many seconds (default: None for no limit).
+        mode (str) : 'use' to read and write the cache, 'bypass' to ignore it, or 'rebuild' to parse every
+            file again and overwrite the cache (default: 'use').
+        """
+        if mode not in self.modes:
+            raise ValueError(f'Unknown srt cache mode: {mode}')
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.mode = mode
+
+    def load(self, srt_file):
+        """
+        Load the parsed dataframe of an srt file if it is cached and unchanged.
+
+        Parameters:
+        srt_file (str) : The path of the srt file.
+
+        Returns:
+        content_df (pandas dataframe) : The cached dataframe, or None on a miss.
+        """
+        if self.mode != 'use':
+            return None
+
+        cache_file = self._cache_file(srt_file)
+        try:
+            content_df = pd.read_parquet(cache_file)
+        except FileNotFoundError:
+            return None
+
+        # mark the file as recently used for eviction
+        os.utime(cache_file)
+
+        return content_df
+
+    def save(self, srt_file, content_df):
+        """
+        Write the parsed dataframe of an srt file to the cache.
+
+        Parameters:
+        srt_file (str) : The path of the srt file.
+        content_df (pandas dataframe) : The parsed dataframe.
+        """
+        if self.mode == 'bypass':
+            return
+
+        cache_file = self._cache_file(srt_file)
+        tmp_file = cache_file.with_name(f'{cache_file.stem}.{os.getpid()}.tmp')
+        content_df.to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, cache_file)
+
+    def evict(self):
+        """
+        Remove cached files older than max_age, then the least recently used files above max_bytes.
+        """
+        files = []
+        for cache_file in self.path.glob('*.parquet'):
+            stat = cache_file.stat()
+            files.append((stat.st_mtime, stat.st_size, cache_file))
+        files.sort()
+
+        removed = 0
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            while files and files[0][0] < cutoff:
+                files.pop(0)[2].unlink()
+                removed += 1
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in files)
+            while files and total > self.max_bytes:
+                _, size, cache_file = files.pop(0)
+                cache_file.unlink()
+                total -= size
+                removed += 1
+
+        if removed:
+            logging.info(f'Evicted {removed} files from the srt cache at {self.path}')
+
+    def _cache_file(self, srt_file):
+        """
+        Name the cache file of an srt file from its absolute path, size, modification time and the parser version.
+        """
+        stat = os.stat(srt_file)
+        fingerprint = f'{os.path.abspath(srt_file)}|{stat.st_size}|{stat.st_mtime_ns}|{PARSER_VERSION}'
+
+        return self.path / (hashlib.sha1(fingerprint.encode()).hexdigest() + '.parquet')
@@ -1,6 +1,20 @@
 import re
+import logging
+import numpy as np
 import pandas as pd
 
+from multiprocessing.pool import Pool
+
+# precompiled patterns for the single pass tokenizer
+TAG_PATTERN = re.compile(r'<[^>]+>')
+PAIR_PATTERN = re.compile(r'(\w+)\s*:\s*([^\s\[\],]+)')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# dji timestamps, with milliseconds and optional microseconds after a dot or comma
+TIMESTAMP_PATTERN = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[.,](\d{3})(?:[.,](\d{3}))?$'
+# version of the dataframe read_srt returns, bump it whenever its columns, dtypes or values change
+# so files cached by an older parser are parsed again
+PARSER_VERSION = 1
+
 class SrtReader():
     # class for reading a list of .srt files and extracting the information
     # compiled into a dataframe
@@ -8,7 +22,10 @@ class SrtReader():
                  srt_col_name='srt_path',  
                  folder_col_name='labelling_foldername',
                  drop_cols=[], 
-                 trim_time=True):
+                 trim_time=True,
+                 processes=1,
+                 cache=None,
+                 frames=None):
         """
         Initialize the SrtReader object.
         
@@ -18,12 +35,24 @@ class SrtReader():
         folder_col_name (str) : Column name in the dataframe containing the folder names (default: 'labelling_foldername')
         drop_cols (list) : List of columns to drop from the dataframe after reading srt files.
         trim_time (bool) : Whether or not to trim the time from the start and end of each subtitle (default: True)."
+        processes (int) : Number of processes parsing srt files in parallel, 1 to parse serially (default: 1).
+        cache (SrtCache) : On-disk cache of parsed srt files, so unchanged files are not parsed again (default: None).
+        frames (dict) : Maps each folder name to the set of frame numbers wanted, so other subtitle blocks are
+            skipped without tokenizing (default: None to read every frame).
         """
         self.srt_list = df[srt_col_name]
         self.folder_col_name = folder_col_name
         self.folder_list = df[folder_col_name]
         self.drop_cols = drop_cols
         self.trim_time = trim_time
+        self.processes = processes
+        self.cache = cache
+        self.frames = frames
+
+        # positions of the srt files of each folder
+        self.folder_rows = {}
+        for position, folder_name in enumerate(self.folder_list):
+            self.folder_rows.setdefault(folder_name, []).append(position)
 
     def make_df(self):
         """
@@ -32,18 +61,73 @@ class SrtReader():
         Returns:
         final_df (pandas dataframe) : A dataframe containing the extracted information from the srt files.
         """
-        # cycle through srt_list and read each file
-        self.final_df = pd.DataFrame()
-        for folder_name, srt_file in zip(self.folder_list, self.srt_list):
-            if srt_file.startswith('drive/'):
-                srt_file = srt_file.replace('drive/', '/content/drive/')
-            srt_df = self.read_srt(srt_file)
+        srt_files = [self.srt_path(srt_file) for srt_file in self.srt_list]
+
+        # select the wanted frames of each folder
+        if self.frames is None:
+            wanted = [None] * len(srt_files)
+        else:
+            wanted = [self.frames.get(folder_name, set()) for folder_name in self.folder_list]
+
+        # read each file, across a process pool if configured
+        if self.processes > 1 and len(srt_files) > 1:
+            with Pool(min(self.processes, len(srt_files))) as pool:
+                srt_dfs = pool.starmap(self._load_srt, zip(srt_files, wanted))
+        else:
+            srt_dfs = [self._load_srt(srt_file, frames) for srt_file, frames in zip(srt_files, wanted)]
+
+        return self.combine(srt_dfs)
+
+    def load_folder(self, folder_name, frames=None, pool=None):
+        """
+        Load the parsed srt files of a single folder, so folders can be read as they become ready.
+
+        Parameters:
+        folder_name (str) : The folder name.
+        frames (set) : The frame numbers to read (default: None to read every frame).
+        pool (multiprocessing.pool.Pool) : A process pool parsing the files, started before any other
+            threads (default: None to parse in the calling thread).
+
+        Returns:
+        srt_dfs (dict) : The parsed dataframe of each srt file of the folder, keyed by its position in the
+            dataframe passed during initialization, as combine expects them.
+        """
+        positions = self.folder_rows.get(folder_name, [])
+        srt_files = self.folder_files(folder_name)
+        if pool is not None:
+            srt_dfs = pool.starmap(self._load_srt, [(srt_file, frames) for srt_file in srt_files])
+        else:
+            srt_dfs = [self._load_srt(srt_file, frames) for srt_file in srt_files]
+
+        return dict(zip(positions, srt_dfs))
+
+    def folder_files(self, folder_name):
+        """
+        List the mounted paths of the srt files of a folder, in the order of the dataframe passed during
+        initialization.
+        """
+        return [self.srt_path(self.srt_list.iloc[position]) for position in self.folder_rows.get(folder_name, [])]
+
+    def combine(self, srt_dfs):
+        """
+        Combine the parsed dataframes of every srt file into the final dataframe.
+
+        Parameters:
+        srt_dfs (list) : The parsed dataframe of each srt file, in the order of the dataframe passed during
+            initialization.
+
+        Returns:
+        final_df (pandas dataframe) : A dataframe containing the extracted information from the srt files.
+        """
+        if self.cache is not None:
+            self.cache.evict()
 
-            # create foldername column
+        # create foldername column
+        for folder_name, srt_df in zip(self.folder_list, srt_dfs):
             srt_df[self.folder_col_name] = folder_name
 
-            # combine with final df
-            self.final_df = pd.concat([self.final_df, srt_df])
+        # combine into the final df once
+        self.final_df = pd.concat(srt_dfs) if srt_dfs else pd.DataFrame()
 
         # modify timestamp
         if self.trim_time:
@@ -53,27 +137,90 @@ class SrtReader():
         self.final_df.reset_index(drop=True, inplace=True)
         
         # drop columns
-        self.final_df.drop(self.drop_cols, axis=1, inplace=True)
+        self.final_df.drop(self.drop_cols, axis=1, inplace=True, errors='ignore')
 
         return self.final_df
 
-    def read_srt(self, file_name):
+    def srt_path(self, srt_file):
+        """
+        Map an srt file path from the detection table to its mounted location.
+        """
+        if srt_file.startswith('drive/'):
+            srt_file = srt_file.replace('drive/', '/content/drive/')
+
+        return srt_file
+
+    def read_srt(self, file_name, frames=None):
         """
         Reads a single srt file and returns the extracted information as a dataframe.
 
         Parameters:
         file_name (str) : The file path of the srt file to be read
+        frames (set) : The frame numbers to read, numbered by subtitle block (default: None to read every frame).
 
         Returns:
-        content_df (pandas dataframe) : A dataframe containing the extracted information from the srt file.
+        content_df (pandas dataframe) : A dataframe containing the extracted information from the srt file,
+            with numeric columns converted to numeric dtypes.
         """
         # read the file
         with open(file_name, 'r') as f:
-            lines = re.split('\n\n', f.read())
+            blocks = f.read().split('\n\n')
+
+        # tokenize each subtitle block straight into per-column lists
+        columns = {}
+        timestamps = []
+        frame_numbers = []
+        for n, block in enumerate(blocks):
+            if frames is not None and n not in frames:
+                continue
+            if len(block) <= 250:
+                continue
+            time, info = TAG_PATTERN.sub('', block).split('\n')[3:5]
+            row = len(frame_numbers)
+            for key, value in PAIR_PATTERN.findall(info.replace('Drone: ', '')):
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = [None] * row
+                if len(column) == row:
+                    column.append(value)
+            timestamps.append(time)
+            frame_numbers.append(n)
+
+            # pad keys missing from this block
+            for column in columns.values():
+                if len(column) == row:
+                    column.append(None)
+
+        content = {key: _typed_column(values) for key, values in columns.items()}
+        content['timestamp'] = np.array(timestamps, dtype=object)
+        content['frame'] = np.array(frame_numbers, dtype=np.int64)
+        content_df = pd.DataFrame(content)
+
+        return content_df
+
+    def _load_srt(self, file_name, frames=None):
+        """
+        Load a parsed srt file from the cache, parsing and caching it on a miss.
+
+        The whole file is cached, so requests for any subset of its frames are sliced from the same entry
+        and adding or removing labels never parses the file again.
+
+        Parameters:
+        file_name (str) : The file path of the srt file to be read
+        frames (set) : The frame numbers to read (default: None to read every frame).
+
+        Returns:
+        content_df (pandas dataframe) : A dataframe containing the extracted information from the srt file.
+        """
+        if self.cache is None:
+            return self.read_srt(file_name, frames)
 
-        # parse contents to srt conversion
-        contents = [self.extract_content(line, n) for n, line in enumerate(lines) if len(line) > 250]
-        content_df = pd.DataFrame.from_dict(contents)
+        content_df = self.cache.load(file_name)
+        if content_df is None:
+            content_df = self.read_srt(file_name)
+            self.cache.save(file_name, content_df)
+        if frames is not None:
+            content_df = content_df[content_df['frame'].isin(frames)].reset_index(drop=True)
 
         return content_df
 
@@ -108,5 +255,46 @@ class SrtReader():
         return info
 
     def _trim_timestamp(self):
-        ## TODO
-        pass
+        """
+        Trim surrounding whitespace from the subtitle timestamps and parse them into datetime64.
+
+        Timestamps are read as 'YYYY-MM-DD HH:MM:SS' followed by milliseconds and optional microseconds,
+        each after a dot or a comma. If any timestamp has another form, the trimmed strings are kept.
+        """
+        if 'timestamp' not in self.final_df:
+            return
+
+        timestamps = self.final_df['timestamp'].astype(str).str.strip()
+        parts = timestamps.str.extract(TIMESTAMP_PATTERN)
+        unknown = parts[0].isna()
+        if unknown.any():
+            logging.warning(f'Keeping SRT timestamps as text, {unknown.sum()} have an unknown format '
+                            f'such as {timestamps[unknown].iloc[0]!r}')
+            self.final_df['timestamp'] = timestamps
+            return
+
+        normalised = parts[0] + '.' + parts[1] + parts[2].fillna('000')
+        self.final_df['timestamp'] = pd.to_datetime(normalised, format=TIMESTAMP_FORMAT)
+
+
+def _typed_column(values):
+    """
+    Convert a list of string values into an integer or float array when every value is numeric.
+
+    Parameters:
+    values (list) : A list of strings, with None for missing values.
+
+    Returns:
+    array (numpy array) : An int64 or float64 array, or an object array if any value is not numeric.
+    """
+    try:
+        array = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array(values, dtype=object)
+
+    # keep whole numbers as integers when nothing is missing, nan or infinite
+    if (None not in values and np.isfinite(array).all()
+            and not any('.' in value or 'e' in value.lower() for value in values)):
+        return array.astype(np.int64)
+
+    return array
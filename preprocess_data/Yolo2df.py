@@ -1,6 +1,12 @@
+import re
+import numpy as np
 import pandas as pd
 import logging
 
+# a label file made only of lines with exactly five values
+LABEL_LINE = r'[ \t]*\S+(?:[ \t]+\S+){4}[ \t]*'
+LABEL_FILE_PATTERN = re.compile(rf'{LABEL_LINE}(?:\r?\n{LABEL_LINE})*')
+
 class Yolo2df:
     def __init__(self, height, width, classes, columns, ext='.jpg'):
         """
@@ -37,20 +43,7 @@ class Yolo2df:
         for item in files_list:
             image_id += 1
             with open(item, 'rt') as fd:
-                for line in fd.readlines():
-                    row = []
-                    nums = [float(num) for num in line.split()]
-                    try:
-                        row.append(self.classes[int(nums[0])])
-                        row.extend(self._convert_yolo(*nums[1:]))
-                        row.append(str(item.with_suffix(ext)))
-                        row.append(self.width)
-                        row.append(self.height)
-                        row.append(int(item.stem))
-                        row.append(item.parent.name)
-                        final_df.append(row)
-                    except Exception as e:
-                        logging.exception(e)
+                final_df.extend(self._file_rows(item, fd.readlines(), ext))
 
         # convert the list of rows to a dataframe and remove duplicates
         df = pd.DataFrame(final_df, columns=self.columns)
@@ -58,6 +51,134 @@ class Yolo2df:
 
         return df
 
+    def write_df_bulk(self, files_list, ext='.jpg'):
+        """
+        Converts the YOLO detection output files to a dataframe, parsing every box in a single array.
+
+        Files that are not made of whole five value lines fall back to the row by row parser.
+
+        Parameters:
+        files_list (list): a list of file paths for the YOLO output files.
+        ext (str): the file extension of the image (default: '.jpg').
+
+        Returns:
+        df (pandas.DataFrame): a dataframe containing the detection data, as returned by write_df.
+        """
+        files_list = list(files_list)
+        texts = []
+        for item in files_list:
+            with open(item, 'rt') as fd:
+                texts.append(fd.read())
+
+        return self.texts_to_df(files_list, texts, ext)
+
+    def texts_to_df(self, files_list, texts, ext='.jpg'):
+        """
+        Converts the contents of YOLO detection output files to a dataframe with vectorized operations.
+
+        Parameters:
+        files_list (list): a list of file paths for the YOLO output files.
+        texts (list): the text content of each file.
+        ext (str): the file extension of the image (default: '.jpg').
+
+        Returns:
+        df (pandas.DataFrame): a dataframe containing the detection data, as returned by write_df.
+        """
+        # find the files made of whole five value lines
+        bulk_ids, line_counts, bulk_texts, frames, fallback_rows = [], [], [], [], []
+        for file_id, (item, text) in enumerate(zip(files_list, texts)):
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                frame = int(item.stem)
+                valid = LABEL_FILE_PATTERN.fullmatch(text) is not None
+            except ValueError:
+                valid = False
+            if valid:
+                n_lines = text.count('\n') + 1
+                bulk_ids.append(file_id)
+                line_counts.append(n_lines)
+                bulk_texts.append(text)
+                frames.append(frame)
+            else:
+                rows = self._file_rows(item, text.splitlines(), ext)
+                fallback_rows.extend([file_id] + row for row in rows)
+
+        # parse every box into one array
+        try:
+            values = np.array(' '.join(bulk_texts).split(), dtype=np.float64).reshape(-1, 5)
+        except ValueError:
+            logging.warning('Non numeric YOLO labels found, parsing row by row.')
+            rows = [row for item, text in zip(files_list, texts)
+                    for row in self._file_rows(item, text.splitlines(True), ext)]
+            return pd.DataFrame(rows, columns=self.columns).drop_duplicates('filename')
+
+        # drop boxes with unknown classes, negative ids counting back from the last class as in _file_rows
+        file_ids = np.repeat(np.array(bulk_ids, dtype=np.int64), line_counts)
+        frames = np.repeat(np.array(frames, dtype=np.int64), line_counts)
+        class_ids = values[:, 0].astype(np.int64)
+        known = (class_ids >= -len(self.classes)) & (class_ids < len(self.classes))
+        if not known.all():
+            logging.warning(f'Skipping {np.count_nonzero(~known)} boxes with unknown classes.')
+            values, file_ids, frames, class_ids = values[known], file_ids[known], frames[known], class_ids[known]
+
+        # convert the coordinates and map the classes for every box at once
+        x, y, w, h = values[:, 1], values[:, 2], values[:, 3], values[:, 4]
+        names = [str(item.with_suffix(ext)) for item in files_list]
+        folders = [item.parent.name for item in files_list]
+        data = [np.array(self.classes, dtype=object)[class_ids],
+                np.round((x - w / 2) * self.width, 1),
+                np.round((y - h / 2) * self.height, 1),
+                np.round(w * self.width, 1),
+                np.round(h * self.height, 1),
+                np.array(names, dtype=object)[file_ids],
+                np.full(len(values), self.width),
+                np.full(len(values), self.height),
+                frames,
+                np.array(folders, dtype=object)[file_ids]]
+        df = pd.DataFrame(dict(zip(self.columns, data)))
+
+        # merge rows from the fallback parser back in file order
+        if fallback_rows:
+            df.insert(0, 'file_id', file_ids)
+            fallback_df = pd.DataFrame(fallback_rows, columns=['file_id'] + self.columns)
+            df = pd.concat([df, fallback_df]).sort_values('file_id', kind='stable')
+            df = df.drop(columns='file_id').reset_index(drop=True)
+        df = df.drop_duplicates('filename')
+
+        return df
+
+    def _file_rows(self, item, lines, ext='.jpg'):
+        """
+        Parse the lines of a single YOLO detection output file into rows.
+
+        Parameters:
+        item (pathlib.Path): the path of the YOLO output file.
+        lines (list): the lines of the file.
+        ext (str): the file extension of the image (default: '.jpg').
+
+        Returns:
+        rows (list): a list of rows, one per valid line.
+        """
+        rows = []
+        for line in lines:
+            row = []
+            nums = [float(num) for num in line.split()]
+            try:
+                row.append(self.classes[int(nums[0])])
+                row.extend(self._convert_yolo(*nums[1:]))
+                row.append(str(item.with_suffix(ext)))
+                row.append(self.width)
+                row.append(self.height)
+                row.append(int(item.stem))
+                row.append(item.parent.name)
+                rows.append(row)
+            except Exception as e:
+                logging.exception(e)
+
+        return rows
+
     def _convert_yolo(self, x, y, w, h):
         """
         Convert bounding box coordinates from YOLO format to COCO format.
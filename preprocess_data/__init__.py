@@ -1,5 +1,19 @@
 from .utils import *
+from .SrtCache import *
 from .SrtReader import *
+from .HammingIndex import *
+from .HashStore import *
+from .HashCache import *
+from .HashExecutor import *
+from .PerceptualHash import *
 from .DuplicateRemover import *
 from .DF2Coco import *
-from .Yolo2df import *
\ No newline at end of file
+from .CocoWriter import *
+from .Yolo2df import *
+from .LabelReader import *
+from .ArchiveExtractor import *
+from .Pipeline import *
+from .RunManifest import *
+from .ArchiveCatalog import *
+from .Metrics import *
+from .FrameCache import *
\ No newline at end of file
@@ -1,11 +1,17 @@
 from preprocess_data import *
+from preprocess_data.SrtReader import _typed_column
 
 import pytest
 import os
+import sys
+import json
 import tempfile
+import numpy as np
 
+from multiprocessing.pool import Pool
 from PIL import Image
 from pathlib import Path
+from Config import Config
 
 # class TestStartLogging:
 #     def setup_method(self):
@@ -123,3 +129,700 @@ def test_get_grays():
 
     assert len(grays) == 25
     assert all(isinstance(x, int) for x in grays)
+
+
+def test_dhash_batch_matches_reference():
+    rng = np.random.default_rng(0)
+    grays = rng.integers(0, 256, size=(20, 9, 9), dtype=np.uint8)
+    row_hashes, col_hashes = dhash_batch(grays)
+    hashes = dhash_to_int(row_hashes, col_hashes)
+
+    # reference implementation of the per pixel dhash loop
+    for grid, dhash in zip(grays, hashes):
+        flat = grid.ravel().tolist()
+        row_hash = col_hash = 0
+        for y in range(8):
+            for x in range(8):
+                offset = y * 9 + x
+                row_hash = row_hash << 1 | (flat[offset] < flat[offset + 1])
+                col_hash = col_hash << 1 | (flat[offset] < flat[offset + 9])
+        assert dhash == row_hash << 64 | col_hash
+
+    assert row_hashes.dtype == np.uint64
+    assert row_hashes.shape == (20, 1)
+
+
+def test_hamming_index():
+    index = HammingIndex(threshold=3)
+    base = (1 << 127) | 0xFF
+    index.add(base, 'a')
+    index.add(base ^ 0b1111, 'b')
+
+    assert index.nearest(base ^ 0b11) == 'a'
+    assert [key for _, key in index.query(base ^ 0b11)] == ['a', 'b']
+    assert index.nearest(base ^ (0b1111 << 40)) is None
+
+
+def test_match_hashes_threshold():
+    hashes = [0b0000, 0b0001, 0b1111, 0b0011]
+    assert DuplicateRemover(pd.DataFrame()).match_hashes(hashes) == []
+    assert DuplicateRemover(pd.DataFrame(), threshold=2).match_hashes(hashes) == [(1, 0), (3, 0)]
+
+
+def test_match_hashes_window():
+    # frames listed out of order, frame 3 drifts back to frame 0 outside the window
+    img_list = ['3.jpg', '0.jpg', '1.jpg', '2.jpg']
+    hashes = [0b0000, 0b0000, 0b0111, 0b1111]
+    dr = DuplicateRemover(pd.DataFrame(), threshold=1, strategy='window', window_size=1)
+
+    assert dr.match_hashes(hashes, img_list) == [(3, 2)]
+
+    dr.window_size = 3
+    assert dr.match_hashes(hashes, img_list) == [(3, 2), (0, 1)]
+
+
+def test_match_hashes_64_bit(monkeypatch):
+    # the package exports the class under the module's name, so patch the module itself
+    hamming_module = sys.modules['preprocess_data.HammingIndex']
+
+    # random 64 bit hashes, every fifth a near copy of the one before
+    rng = np.random.default_rng(0)
+    hashes = []
+    for i in range(500):
+        if i % 5:
+            hashes.append(int(rng.integers(0, 1 << 63)) << 1 | int(rng.integers(0, 2)))
+        else:
+            flips = rng.choice(64, size=3, replace=False)
+            hashes.append(hashes[-1] ^ sum(1 << int(bit) for bit in flips) if hashes else 0)
+
+    compared = []
+    def counting_distance(a, b):
+        compared.append(1)
+        return hamming_distance(a, b)
+    monkeypatch.setattr(hamming_module, 'hamming_distance', counting_distance)
+
+    dr = DuplicateRemover(pd.DataFrame(), threshold=4, hash_algos=('phash',))
+    assert dr.match_hashes(hashes, None) == [(i, i - 1) for i in range(5, 500, 5)]
+    # only hashes sharing a 13 bit block are compared, far from the 124750 pairs of a full comparison
+    assert len(compared) < 2000
+
+
+def test_hash_store():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = HashStore(temp_dir, capacity=2)
+        base = (0xABCD << 64) | 0x1234
+        store.add('flight_a', [0, 1, 2], [base, base ^ 1, base ^ (0xFF << 70)])
+
+        # reopen from disk and query across folders
+        store = HashStore(temp_dir)
+        assert len(store) == 3
+        assert store.has_folder('flight_a')
+        assert store.query([base], threshold=0) == [(0, 'flight_a', 0, 0)]
+        assert store.query([base ^ (1 << 100)], threshold=2) == [(0, 'flight_a', 0, 1), (0, 'flight_a', 1, 2)]
+        assert store.query([base], threshold=2, exclude_folder='flight_a') == []
+
+        # above 7 bits every row is scanned, and candidates are compared a few pairs at a time
+        store.max_pairs = 2
+        far = base ^ (0xFF << 70) ^ 1
+        assert store.query([far, base], threshold=9) == [(0, 'flight_a', 2, 1), (0, 'flight_a', 1, 8),
+                                                         (0, 'flight_a', 0, 9),
+                                                         (1, 'flight_a', 0, 0), (1, 'flight_a', 1, 1),
+                                                         (1, 'flight_a', 2, 8)]
+        assert store.query([base ^ (1 << 100)], threshold=2) == [(0, 'flight_a', 0, 1), (0, 'flight_a', 1, 2)]
+
+        with pytest.raises(ValueError):
+            DuplicateRemover(pd.DataFrame(), hash_store=store, hash_algos=('dhash', 'ahash'))
+
+        # a store of another hash is refused, an empty one takes the new hash
+        with pytest.raises(ValueError):
+            HashStore(temp_dir, algorithm='phash')
+        with open(os.path.join(temp_dir, 'meta.json')) as f:
+            assert json.load(f)['algorithm'] == 'dhash'
+        assert HashStore(os.path.join(temp_dir, 'empty'), algorithm='phash').algorithm == 'phash'
+
+
+def test_hash_cache():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'img.jpg')
+        Image.new('L', (10, 10), 255).save(path)
+        cache = HashCache(os.path.join(temp_dir, 'cache.db'))
+
+        assert cache.get_many([path]) == [None]
+        cache.put_many([path], [(1 << 127) | 5])
+        assert cache.get_many([path]) == [(1 << 127) | 5]
+
+        # a changed file is hashed again
+        os.utime(path, ns=(0, 0))
+        assert cache.get_many([path]) == [None]
+        cache.close()
+
+
+def test_lookup_df_index():
+    lookup_df = pd.DataFrame({'img_dir': ['data/a', 'data/b', 'data/b'],
+                              'dup_list': ['[(1, 0), (2, 0)]', '(3, 1)', '(4, 1)'],
+                              'order': 'sorted'})
+    dr = DuplicateRemover(lookup_df)
+
+    assert dr.lookup == {'data/a': [(1, 0), (2, 0)], 'data/b': [(3, 1), (4, 1)]}
+    assert dr.lookup_df.dup_list.tolist() == ['[(1, 0), (2, 0)]', '[(3, 1), (4, 1)]']
+    assert dr.lookup_df.order.tolist() == ['sorted', 'sorted']
+
+
+def test_lookup_df_legacy_order():
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (32, 40), dtype=np.uint8) for _ in range(3)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        img_dir = Path(temp_dir) / 'a'
+        img_dir.mkdir()
+        # frame 2 repeats frame 0
+        for i, frame in enumerate([frames[0], frames[1], frames[0], frames[2]]):
+            Image.fromarray(frame).save(img_dir / f'{i:06d}.jpg')
+            (img_dir / f'{i:06d}.txt').write_text('0 0.5 0.5 0.1 0.1\n')
+
+        # a table written before the image list was sorted, its indices pointing into glob order
+        legacy_df = pd.DataFrame({'img_dir': [str(img_dir)], 'dup_list': ['[(1, 3)]']})
+        dr = DuplicateRemover(legacy_df)
+        assert dr.lookup == {}
+
+        dr.remove_duplicates(img_dir)
+        assert dr.lookup == {str(img_dir): [(2, 0)]}
+        assert sorted(p.name for p in img_dir.glob('*.jpg')) == ['000000.jpg', '000001.jpg', '000003.jpg']
+
+
+def test_fast_hash_draft_mode():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'img.jpg')
+        gradient = np.tile(np.arange(0, 256, 0.5, dtype=np.uint8)[:640], (512, 1))
+        Image.fromarray(np.stack([gradient] * 3, axis=-1)).save(path)
+
+        exact = DuplicateRemover(pd.DataFrame())._make_hash(path)
+        fast = DuplicateRemover(pd.DataFrame(), fast_hash=True)._make_hash(path)
+
+        assert hamming_distance(exact, fast) <= 4
+
+
+def test_hash_executor_order():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        img_list = []
+        for i in range(6):
+            path = os.path.join(temp_dir, f'{i}.jpg')
+            Image.new('L', (10, 10), i * 40).save(path)
+            img_list.append(path)
+
+        dr = DuplicateRemover(pd.DataFrame())
+        serial = dr.make_hashes(img_list)
+        with HashExecutor(dr, processes=2, chunksize=1, min_pool_items=1) as executor:
+            dr.executor = executor
+            assert dr.make_hashes(img_list) == serial
+            assert executor.pool is not None
+
+
+def test_hash_registry_single_decode():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'img.jpg')
+        Image.fromarray(np.random.default_rng(0).integers(0, 256, (64, 80), dtype=np.uint8)).save(path)
+
+        dhash_only = DuplicateRemover(pd.DataFrame())
+        combined = DuplicateRemover(pd.DataFrame(), hash_algos=('dhash', 'phash', 'whash', 'ahash'))
+        grids = combined._load_grids(path)
+
+        assert [grid.shape for grid in grids] == [(9, 9), (32, 32), (64, 64), (8, 8)]
+        assert dhash_only.make_hashes([path]) == [dhash_only._make_hash(path)]
+        assert combined.make_hashes([path])[0] >> 192 == dhash_only._make_hash(path)
+
+    with pytest.raises(ValueError):
+        DuplicateRemover(pd.DataFrame(), hash_algos=('nohash',))
+
+
+def write_srt(path, frames, second=3):
+    # write a DJI style srt file with one subtitle block per frame
+    blocks = []
+    for n in range(frames):
+        blocks.append(
+            f'{n + 1}\n00:00:00,{n * 33:03d} --> 00:00:00,{n * 33 + 33:03d}\n'
+            f'<font size="28">FrameCnt: {n + 1}, DiffTime: 33ms\n'
+            f'2023-01-17 20:37:{second:02d}.{n * 33:03d}\n'
+            f'[iso: 100] [shutter: 1/30.0] [fnum: 280] [ev: 0] [color_md: default] [focal_len: 240] '
+            f'[latitude: -28.7988{n:02d}] [longtitude: 153.412660] [rel_alt: 60.000 abs_alt: 78.779] '
+            f'[Drone: Yaw:-12.3, Pitch:0.0, Roll:1.2] </font>')
+    with open(path, 'w') as f:
+        f.write('\n\n'.join(blocks) + '\n\n')
+
+
+def test_SrtReader_parallel():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        srt_paths = []
+        for i in range(3):
+            srt_paths.append(os.path.join(temp_dir, f'{i}.SRT'))
+            write_srt(srt_paths[-1], 5 + i, second=i)
+        df = pd.DataFrame({'srt_path': srt_paths, 'labelling_foldername': ['a', 'b', 'c']})
+
+        serial_df = SrtReader(df, drop_cols=['color_md']).make_df()
+        parallel_df = SrtReader(df, drop_cols=['color_md'], processes=2).make_df()
+
+        # folders loaded one at a time across a pool, then combined in table order
+        reader = SrtReader(df, drop_cols=['color_md'])
+        srt_dfs = [None] * 3
+        with Pool(2) as pool:
+            for folder in ['c', 'a', 'b']:
+                for position, srt_df in reader.load_folder(folder, pool=pool).items():
+                    srt_dfs[position] = srt_df
+        folder_df = reader.combine(srt_dfs)
+
+    pd.testing.assert_frame_equal(serial_df, parallel_df)
+    pd.testing.assert_frame_equal(serial_df, folder_df)
+    assert len(serial_df) == 5 + 6 + 7
+    assert serial_df.labelling_foldername.tolist()[:6] == ['a'] * 5 + ['b']
+    assert serial_df.frame.tolist()[:6] == [0, 1, 2, 3, 4, 0]
+
+
+def test_SrtReader_typed_columns():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        srt_path = os.path.join(temp_dir, 'flight.SRT')
+        write_srt(srt_path, 3)
+        df = pd.DataFrame({'srt_path': [srt_path], 'labelling_foldername': ['a']})
+        srt_df = SrtReader(df, drop_cols=['color_md']).make_df()
+
+    assert srt_df.latitude.dtype == np.float64
+    assert srt_df.Yaw.tolist() == [-12.3] * 3
+    assert srt_df.iso.dtype == np.int64
+    assert srt_df.shutter.tolist() == ['1/30.0'] * 3
+    assert pd.api.types.is_datetime64_any_dtype(srt_df.timestamp)
+    assert DF2Coco()._format_timestamps(srt_df.timestamp)[1] == '2023-01-17 20:37:03.033'
+
+    # dji timestamps with microseconds after commas, and unknown forms kept as text
+    reader = SrtReader(df)
+    reader.final_df = pd.DataFrame({'timestamp': ['2023-01-17 20:37:26,366,185 ', '2023-01-17 20:37:26.400']})
+    reader._trim_timestamp()
+    assert DF2Coco()._format_timestamps(reader.final_df.timestamp) == ['2023-01-17 20:37:26.366185',
+                                                                       '2023-01-17 20:37:26.400000']
+    reader.final_df = pd.DataFrame({'timestamp': ['2023-01-17 20:37:26.366', 'Jan 17 20:37']})
+    reader._trim_timestamp()
+    assert reader.final_df.timestamp.tolist() == ['2023-01-17 20:37:26.366', 'Jan 17 20:37']
+
+    assert _typed_column(['1', '2']).dtype == np.int64
+    assert _typed_column(['1', 'nan']).dtype == np.float64
+    assert _typed_column(['inf', '2']).tolist() == [np.inf, 2.0]
+
+
+def test_SrtCache(monkeypatch):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        srt_path = os.path.join(temp_dir, 'flight.SRT')
+        write_srt(srt_path, 3)
+        df = pd.DataFrame({'srt_path': [srt_path], 'labelling_foldername': ['a']})
+        cache = SrtCache(os.path.join(temp_dir, 'cache'))
+
+        parsed_df = SrtReader(df, cache=cache).make_df()
+        assert cache.load(srt_path) is not None
+        cached_df = SrtReader(df, cache=cache).make_df()
+        pd.testing.assert_frame_equal(parsed_df, cached_df)
+
+        # files cached by another parser version are parsed again
+        monkeypatch.setattr(sys.modules['preprocess_data.SrtCache'], 'PARSER_VERSION', PARSER_VERSION + 1)
+        assert cache.load(srt_path) is None
+        monkeypatch.undo()
+        assert cache.load(srt_path) is not None
+
+        # a changed file misses the cache, and eviction empties it
+        write_srt(srt_path, 4)
+        os.utime(srt_path, ns=(1, 1))
+        assert cache.load(srt_path) is None
+        cache.max_bytes = 0
+        cache.evict()
+        assert not list(cache.path.glob('*.parquet'))
+
+
+def test_SrtReader_selected_frames():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        srt_path = os.path.join(temp_dir, 'flight.SRT')
+        write_srt(srt_path, 6)
+        df = pd.DataFrame({'srt_path': [srt_path], 'labelling_foldername': ['a']})
+        full_df = SrtReader(df).make_df()
+        selected_df = SrtReader(df, frames={'a': {1, 4}}).make_df()
+
+        # a cached full parse serves the subset too
+        cache = SrtCache(os.path.join(temp_dir, 'cache'))
+        SrtReader(df, cache=cache).make_df()
+        cached_df = SrtReader(df, cache=cache, frames={'a': {1, 4}}).make_df()
+
+        # a subset missing the cache caches the whole file, serving other subsets
+        subset_cache = SrtCache(os.path.join(temp_dir, 'subset_cache'))
+        SrtReader(df, cache=subset_cache, frames={'a': {2}}).make_df()
+        assert len(list(subset_cache.path.glob('*.parquet'))) == 1
+        subset_df = SrtReader(df, cache=subset_cache, frames={'a': {1, 4}}).make_df()
+        assert len(list(subset_cache.path.glob('*.parquet'))) == 1
+
+    expected_df = full_df[full_df.frame.isin([1, 4])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(selected_df, expected_df)
+    pd.testing.assert_frame_equal(cached_df, expected_df)
+    pd.testing.assert_frame_equal(subset_df, expected_df)
+
+
+def test_Yolo2df_bulk_matches_write_df():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = Path(temp_dir) / 'flight'
+        folder.mkdir()
+        contents = {'000003.txt': '1 0.5 0.5 0.2 0.1\n0 0.1 0.2 0.3 0.4\n',
+                    '000001.txt': '0 0.25 0.75 0.05 0.15',
+                    '000002.txt': '7 0.1 0.1 0.1 0.1\n\n1 0.3 0.3 0.1 0.1\n',
+                    '000004.txt': '',
+                    '000005.txt': '-1 0.5 0.5 0.1 0.1\n-3 0.5 0.5 0.1 0.1\n'}
+        for name, content in contents.items():
+            (folder / name).write_text(content)
+
+        yolo2df = Yolo2df(512, 640, ['koala', 'glider'], Config.columns)
+        files_list = sorted(folder.glob('*.txt'))
+        expected_df = yolo2df.write_df(files_list)
+        bulk_df = yolo2df.write_df_bulk(files_list)
+
+    pd.testing.assert_frame_equal(bulk_df, expected_df)
+    assert bulk_df.frame.tolist() == [1, 2, 3, 5]
+    assert bulk_df['class'].tolist()[-1] == 'glider'
+
+
+def test_LabelReader():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for folder in ['b', 'a']:
+            os.mkdir(os.path.join(temp_dir, folder))
+            for frame in [2, 1]:
+                with open(os.path.join(temp_dir, folder, f'{frame:06d}.txt'), 'w') as f:
+                    f.write(f'0 0.{frame} 0.5 0.1 0.1')
+            Image.new('L', (4, 4)).save(os.path.join(temp_dir, folder, '000001.jpg'))
+
+        # nested label files are found too, while top level files are not
+        os.makedirs(os.path.join(temp_dir, 'a', 'nested'))
+        for path in [os.path.join(temp_dir, 'a', 'nested', '000003.txt'), os.path.join(temp_dir, 'notes.txt')]:
+            with open(path, 'w') as f:
+                f.write('0 0.3 0.5 0.1 0.1')
+
+        reader = LabelReader(threads=2)
+        files_list, texts = reader.read_all(Path(temp_dir))
+        assert LabelReader().read_folder(Path(temp_dir) / 'a') == (files_list[:3], texts[:3])
+        assert LabelReader().read_folder(Path(temp_dir) / 'missing') == ([], [])
+
+    assert [(item.parent.name, item.name) for item in files_list] == [
+        ('a', '000001.txt'), ('a', '000002.txt'), ('nested', '000003.txt'),
+        ('b', '000001.txt'), ('b', '000002.txt')]
+    assert texts[1] == '0 0.2 0.5 0.1 0.1'
+    assert reader.report['files'] == 5
+
+
+def make_label_srt_df():
+    # merged yolo and srt rows as passed to DF2Coco
+    return pd.DataFrame({'class': ['koala', 'bird', 'koala'],
+                         'x': [1.0, 2.0, 3.0], 'y': [4.0, 5.0, 6.0],
+                         'w': [2.0, 3.0, 4.0], 'h': [1.5, 2.0, 2.5],
+                         'filename': ['a/000002.jpg', 'a/000001.jpg', 'a/000002.jpg'],
+                         'width': 640, 'height': 512, 'frame': [2, 1, 2],
+                         'labelling_foldername': 'a',
+                         'latitude': [-28.1, -28.2, -28.1], 'longtitude': [153.1, 153.2, 153.1],
+                         'rel_alt': 60.0, 'abs_alt': 80.0, 'Yaw': 1.0, 'Pitch': 0.0, 'Roll': 2.0,
+                         'timestamp': pd.to_datetime(['2023-01-17 20:37:03.100',
+                                                      '2023-01-17 20:37:03.000',
+                                                      '2023-01-17 20:37:03.100'])})
+
+
+def test_DF2Coco_convert_df():
+    data_coco = DF2Coco(version='1').convert_df(make_label_srt_df())
+
+    assert [image['file_name'] for image in data_coco['images']] == ['a/000001.jpg', 'a/000002.jpg']
+    assert data_coco['images'][0]['longitude'] == 153.2
+    assert data_coco['images'][1]['timestamp'] == '2023-01-17 20:37:03.100'
+    assert data_coco['categories'] == [{'supercategory': 'Animals', 'id': 0, 'name': 'bird'},
+                                       {'supercategory': 'Animals', 'id': 1, 'name': 'koala'}]
+    assert data_coco['annotations'][2] == {'segmentation': [], 'iscrowd': 0, 'area': 10.0,
+                                           'image_id': 1, 'bbox': [3.0, 6.0, 4.0, 2.5],
+                                           'category_id': 1, 'id': 2}
+
+
+def test_CocoWriter_matches_json_dump():
+    df2coco = DF2Coco(version='1', year=2023)
+    data_input = make_label_srt_df()
+    data_coco = df2coco.convert_df(data_input)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'labels.json')
+        counts = CocoWriter(indent=4).write(path, df2coco, data_input)
+        with open(path) as f:
+            assert f.read() == json.dumps(data_coco, indent=4)
+
+        CocoWriter().write(path, df2coco, data_input.iloc[:0])
+        with open(path) as f:
+            assert json.load(f) == {'images': [], 'categories': [], 'annotations': [],
+                                    'info': df2coco._gen_info()}
+
+    assert counts == {'images': 2, 'categories': 2, 'annotations': 3}
+
+
+def test_CocoWriter_shards():
+    df2coco = DF2Coco(version='1')
+    data_input = pd.concat([make_label_srt_df(), make_label_srt_df().assign(
+        filename=['b/000002.jpg', 'b/000001.jpg', 'b/000002.jpg'], labelling_foldername='b')],
+        ignore_index=True)
+    data_coco = df2coco.convert_df(data_input)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'labels.json')
+        for shard_by, shard_size, n_shards in [('folder', 0, 2), ('annotations', 3, 2), ('annotations', 10, 1)]:
+            manifest = CocoWriter().write_shards(path, df2coco, data_input, shard_by, shard_size)
+            with open(os.path.join(temp_dir, 'labels_manifest.json')) as f:
+                assert json.load(f) == manifest
+
+            # shards hold whole images, the full category table and the unsplit ids
+            shards = []
+            for shard in manifest['shards']:
+                with open(os.path.join(temp_dir, shard['file'])) as f:
+                    shards.append(json.load(f))
+                assert shards[-1]['categories'] == data_coco['categories']
+                assert shard['image_ids'] == [min(image['id'] for image in shards[-1]['images']),
+                                              max(image['id'] for image in shards[-1]['images'])]
+            assert len(shards) == n_shards
+            assert sorted(sum([s['images'] for s in shards], []), key=lambda i: i['id']) == data_coco['images']
+            assert sorted(sum([s['annotations'] for s in shards], []), key=lambda a: a['id']) \
+                == data_coco['annotations']
+
+    assert [shard['folders'] for shard in manifest['shards']] == [['a', 'b']]
+
+
+def test_ArchiveExtractor():
+    import zipfile
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        archives = []
+        for name in ['a', 'b']:
+            archive = temp_dir / f'{name}.zip'
+            with zipfile.ZipFile(archive, 'w') as zf:
+                zf.writestr(f'{name}/000001.txt', '0 0.5 0.5 0.1 0.1\n')
+                zf.writestr(f'{name}/000001.jpg', b'\xff\xd8' * 10)
+                zf.writestr(f'{name}/video.MP4', b'0' * 100)
+            archives.append(str(archive))
+        archives.append(str(temp_dir / 'missing.zip'))
+
+        extractor = ArchiveExtractor(workers=2, save_local=True, keep_suffixes=('.jpg', '.txt'))
+        reports = extractor.extract_all(archives, temp_dir / 'data')
+
+        assert [report['ok'] for report in reports] == [True, True, False]
+        assert reports[0]['members'] == 2 and reports[0]['bytes_written'] == 38
+        assert reports[0]['skipped'] == ['a/video.MP4'] and reports[0]['bytes_skipped'] == 100
+        assert sorted(p.name for p in (temp_dir / 'data').glob('*/*')) == ['000001.jpg'] * 2 + ['000001.txt'] * 2
+
+        # archives extracted at the same time into shared folders
+        shared = []
+        for i in range(8):
+            archive = temp_dir / f'shared_{i}.zip'
+            with zipfile.ZipFile(archive, 'w') as zf:
+                zf.writestr('shared/', b'')
+                zf.writestr(f'shared/nested/{i}/000001.txt', '0 0.5 0.5 0.1 0.1\n')
+            shared.append(str(archive))
+        reports = ArchiveExtractor(workers=8).extract_all(shared, temp_dir / 'shared_data')
+
+        assert all(report['ok'] for report in reports)
+        assert len(list((temp_dir / 'shared_data' / 'shared' / 'nested').glob('*/*.txt'))) == 8
+
+
+def test_ArchiveExtractor_dedup_on_extract():
+    import io
+    import zipfile
+
+    # frames 2 and 4 repeat frame 1
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (32, 40), dtype=np.uint8) for _ in range(3)]
+    frames = [frames[0], frames[1], frames[0], frames[2], frames[0]]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        archive = temp_dir / 'a.zip'
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for i, frame in reversed(list(enumerate(frames))):
+                content = io.BytesIO()
+                Image.fromarray(frame).save(content, format='JPEG')
+                zf.writestr(f'a/{i:06d}.{"JPG" if i % 2 else "jpg"}', content.getvalue())
+                zf.writestr(f'a/{i:06d}.txt', '0 0.5 0.5 0.1 0.1\n')
+
+        # extract everything and remove duplicates from disk
+        ArchiveExtractor().extract(archive, temp_dir / 'full')
+        remover = DuplicateRemover(pd.DataFrame())
+        assert remover.remove_duplicates(temp_dir / 'full' / 'a') == 5
+
+        # skip duplicates while extracting, then only record them
+        report = ArchiveExtractor(remover=DuplicateRemover(pd.DataFrame())).extract(archive, temp_dir / 'fused')
+        fused = DuplicateRemover(pd.DataFrame())
+        fused.remove_duplicates(temp_dir / 'fused' / 'a', report['duplicates'][str(temp_dir / 'fused' / 'a')])
+
+        assert fused.lookup[str(temp_dir / 'fused' / 'a')] == remover.lookup[str(temp_dir / 'full' / 'a')] \
+            == [(2, 0), (4, 0)]
+        assert sorted(p.name for p in (temp_dir / 'fused' / 'a').iterdir()) \
+            == sorted(p.name for p in (temp_dir / 'full' / 'a').iterdir())
+        assert report['members'] == 6 and report['bytes_deduped'] > 0
+
+
+def test_Pipeline():
+    import time
+
+    def slow_square(value):
+        time.sleep(0.001 * (value % 3))
+        return value * value
+
+    pipeline = Pipeline([('add', lambda value: value + 1, 3),
+                         ('square', slow_square, 2)], queue_size=1)
+    assert pipeline.run(range(20)) == [(value + 1) ** 2 for value in range(20)]
+    assert pipeline.report['square']['items'] == 20
+
+    def fail(value):
+        if value == 5:
+            raise ValueError('bad item')
+        return value
+
+    with pytest.raises(ValueError):
+        Pipeline([('fail', fail, 2)]).run(range(10))
+
+
+def test_RunManifest():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive = os.path.join(temp_dir, 'a.zip')
+        with open(archive, 'wb') as f:
+            f.write(b'zip')
+        path = os.path.join(temp_dir, 'manifest.json')
+        fingerprint = {'archive': file_fingerprint(archive), 'keep_suffixes': ('.jpg', '.txt')}
+
+        manifest = RunManifest(path)
+        manifest.complete('a', 'extract', fingerprint)
+        manifest.complete('a', 'dedup', {'threshold': 0}, [(2, 0)])
+        manifest.complete(None, 'coco', {'labels': folder_digest(temp_dir)})
+
+        # completed stages are saved in batches, and once the run ends
+        assert not os.path.exists(path)
+        manifest.save()
+
+        # a new run resumes from the saved manifest
+        manifest = RunManifest(path)
+        assert manifest.done('a', 'extract', fingerprint)
+        assert manifest.record('a', 'dedup')['result'] == [[2, 0]]
+        assert manifest.done(None, 'coco', {'labels': folder_digest(temp_dir)})
+        assert not manifest.done('b', 'extract', fingerprint)
+        assert not manifest.done('a', 'dedup', {'threshold': 4})
+
+        # a changed archive invalidates the extraction, and extracting again drops the later stages
+        with open(archive, 'ab') as f:
+            f.write(b'more')
+        assert not manifest.done('a', 'extract', {'archive': file_fingerprint(archive),
+                                                  'keep_suffixes': ('.jpg', '.txt')})
+        manifest.complete('a', 'extract', fingerprint)
+        assert manifest.record('a', 'dedup') is None
+        assert file_fingerprint(os.path.join(temp_dir, 'missing.zip')) is None
+        assert json_digest({'a': 1, 'b': [1, 2]}) == json_digest({'b': (1, 2), 'a': 1})
+
+        # labels in subfolders change the digest too
+        os.makedirs(os.path.join(temp_dir, 'sub'))
+        digest = folder_digest(temp_dir)
+        with open(os.path.join(temp_dir, 'sub', '000001.txt'), 'w') as f:
+            f.write('0 0.5 0.5 0.1 0.1\n')
+        assert folder_digest(temp_dir) != digest
+        assert folder_digest(os.path.join(temp_dir, 'missing')) is None
+
+
+def test_FrameCache():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FrameCache(os.path.join(temp_dir, 'frames'))
+        assert cache.load('a') is None
+
+        label_df = pd.DataFrame({'image': ['000001.jpg', '000002.jpg'], 'class': [0, 1]})
+        srt_dfs = [pd.DataFrame({'frame': [1, 2], 'latitude': [51.5, 51.6]}), pd.DataFrame({'frame': [3]})]
+        cache.save('a', label_df, srt_dfs)
+        loaded_labels, loaded_srts = cache.load('a')
+        pd.testing.assert_frame_equal(loaded_labels, label_df)
+        assert len(loaded_srts) == 2
+        pd.testing.assert_frame_equal(loaded_srts[0], srt_dfs[0])
+
+        # saving again replaces the folder's frames
+        cache.save('a', label_df.iloc[:1], [])
+        loaded_labels, loaded_srts = cache.load('a')
+        assert len(loaded_labels) == 1 and loaded_srts == []
+
+
+def test_ArchiveCatalog():
+    import zipfile
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'source')
+        os.mkdir(source)
+        with zipfile.ZipFile(os.path.join(source, 'a.zip'), 'w') as zf:
+            zf.writestr('a/000001.txt', '0 0.5 0.5 0.1 0.1\n')
+            zf.writestr('a/000001.jpg', b'0' * 50)
+            zf.writestr('a/video.MP4', b'0' * 100)
+        with zipfile.ZipFile(os.path.join(source, 'b.zip'), 'w') as zf:
+            zf.writestr('b/000001.jpg', b'0' * 50)
+        with open(os.path.join(source, 'c.zip'), 'wb') as f:
+            f.write(b'not a zip')
+
+        catalog = ArchiveCatalog(os.path.join(temp_dir, 'catalog.db'))
+        assert catalog.refresh(source) == {'unchanged': 0, 'read': 3, 'removed': 0}
+        assert catalog.refresh(source) == {'unchanged': 3, 'read': 0, 'removed': 0}
+
+        paths = [os.path.join(source, f'{name}.zip') for name in 'abcd']
+        summaries = catalog.summarise(paths, keep_suffixes=('.jpg', '.txt'))
+        assert [summary['status'] for summary in summaries] == ['ok', 'unlabelled', 'bad', 'missing']
+        assert summaries[0]['members'] == 3 and summaries[0]['bytes'] == 68
+        assert catalog.members(paths[0])[0][:2] == ('a/000001.jpg', 50)
+
+        os.remove(paths[1])
+        assert catalog.refresh(source) == {'unchanged': 2, 'read': 0, 'removed': 1}
+        catalog.close()
+
+
+def test_Metrics():
+    metrics = Metrics()
+    with metrics.stage('parse') as record:
+        record['items'] = sum(range(1000))
+    with metrics.stage('dedup', 'a') as record:
+        record['items'] = 3
+    metrics.add({'stage': 'extract', 'folder': 'a', 'wall_seconds': 0.5})
+
+    report = metrics.report()
+    assert [record['stage'] for record in report['stages']] == ['parse']
+    assert [record['stage'] for record in report['folders']] == ['dedup', 'extract']
+    assert report['stages'][0]['items'] == 499500
+    assert report['stages'][0]['wall_seconds'] >= 0 and report['stages'][0]['cpu_seconds'] >= 0
+    assert report['stages'][0]['scope'] == 'process'
+
+    # folder stages overlap across threads, so they only record their own thread
+    folder = report['folders'][0]
+    assert folder['scope'] == 'thread' and folder['items'] == 3
+    assert folder['thread_cpu_seconds'] >= 0 and 'cpu_seconds' not in folder and 'peak_rss_mb' not in folder
+
+    # disabled metrics only hand out empty records
+    disabled = Metrics(enabled=False)
+    with disabled.stage('parse') as record:
+        record['items'] = 1
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'metrics.json')
+        disabled.write(path)
+        assert not os.path.exists(path)
+        metrics.write(path)
+        with open(path) as f:
+            assert json.load(f)['folders'][1]['wall_seconds'] == 0.5
+    assert disabled.records == []
+
+
+def test_synthetic_dataset():
+    import zipfile
+    from benchmarks.synthetic import make_dataset
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        detect_df = make_dataset(Path(temp_dir) / 'a', folders=2, frames=12, duplicate_rate=0.5,
+                                 width=32, height=24, seed=1)
+        again = make_dataset(Path(temp_dir) / 'b', folders=2, frames=12, duplicate_rate=0.5,
+                             width=32, height=24, seed=1)
+        assert len(detect_df) == 2
+
+        with zipfile.ZipFile(detect_df[Config.zip_col][0]) as zf, zipfile.ZipFile(again[Config.zip_col][0]) as zf2:
+            names = zf.namelist()
+            assert [info.CRC for info in zf.infolist()] == [info.CRC for info in zf2.infolist()]
+            images = [zf.read(name) for name in names if name.endswith('.jpg')]
+        assert len(names) == 12 * 2 + 1
+        assert 0 < len(images) - len(set(images)) < 12
+
+        srt_df = SrtReader(detect_df, srt_col_name=Config.srt_col, folder_col_name=Config.name_col).make_df()
+        assert len(srt_df) == 2 * 13 and srt_df['timestamp'].notna().all()